@@ -2,6 +2,13 @@ from django.contrib import admin
 from api import models
 
 admin.site.register(models.Course)
+admin.site.register(models.CourseStats)
+admin.site.register(models.CurriculumSnapshot)
+admin.site.register(models.ImageDerivative)
+admin.site.register(models.StoredBlob)
+admin.site.register(models.UploadSession)
+admin.site.register(models.PaymentVerification)
+admin.site.register(models.IdempotencyRecord)
 admin.site.register(models.Variant)
 admin.site.register(models.VariantItem)
 admin.site.register(models.Question_Answer)
@@ -0,0 +1,181 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, models
+
+MAX_AGE = getattr(settings, "AUTOCOMPLETE_MAX_AGE", 300)
+MEMO_PREFIX_LENGTH = 2
+RANGE_SCAN_LIMIT = 1000
+
+
+def normalize(text):
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+class PrefixIndex:
+    # Sorted array of (term, kind, id) keys searched with bisect. Every word
+    # boundary of a title starts a term, so "pyth" finds "Learn Python".
+    # A second array keeps entries by descending score so that very broad
+    # prefixes can stop after the first `limit` hits instead of ranking the
+    # whole matching range.
+
+    def __init__(self):
+        self._keys = []
+        self._ranked = []
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._memo = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, rows):
+        # Bulk build from (kind, id, title, slug, score) rows: the keys are
+        # gathered and sorted once, where add() would insort every term.
+        with self._lock:
+            for kind, pk, title, slug, score in rows:
+                terms = _terms(title)
+                self._entries[(kind, pk)] = (slug, title, score, terms)
+            self._keys = sorted((term,) + entry_key for entry_key, entry in self._entries.items() for term in entry[3])
+            self._ranked = sorted((-entry[2],) + entry_key for entry_key, entry in self._entries.items())
+            self._memo.clear()
+
+    def add(self, kind, pk, title, slug, score):
+        with self._lock:
+            self._remove((kind, pk))
+            terms = _terms(title)
+            for term in terms:
+                bisect.insort(self._keys, (term, kind, pk))
+            bisect.insort(self._ranked, (-score, kind, pk))
+            self._entries[(kind, pk)] = (slug, title, score, terms)
+            self._memo.clear()
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._remove((kind, pk))
+            self._memo.clear()
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        for term in entry[3]:
+            _discard(self._keys, (term,) + entry_key)
+        _discard(self._ranked, (-entry[2],) + entry_key)
+
+    def search(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        memo_key = (prefix, limit)
+        if len(prefix) <= MEMO_PREFIX_LENGTH and memo_key in self._memo:
+            return self._memo[memo_key]
+
+        with self._lock:
+            low = bisect.bisect_left(self._keys, (prefix,))
+            high = bisect.bisect_left(self._keys, (prefix + "\U0010ffff",))
+
+            if high - low <= RANGE_SCAN_LIMIT:
+                matches = {key[1:] for key in self._keys[low:high]}
+                best = heapq.nlargest(limit, matches, key=lambda entry_key: self._entries[entry_key][2])
+            else:
+                best = []
+                for _, kind, pk in self._ranked:
+                    if any(term.startswith(prefix) for term in self._entries[(kind, pk)][3]):
+                        best.append((kind, pk))
+                        if len(best) == limit:
+                            break
+
+            results = [
+                {"type": kind, "id": pk, "slug": self._entries[(kind, pk)][0], "title": self._entries[(kind, pk)][1], "score": self._entries[(kind, pk)][2]}
+                for kind, pk in best
+            ]
+            if len(prefix) <= MEMO_PREFIX_LENGTH:
+                self._memo[memo_key] = results
+            return results
+
+
+def _terms(title):
+    words = normalize(title).split(" ")
+    return {" ".join(words[start:]) for start in range(len(words)) if words[start]}
+
+
+def _discard(sorted_list, item):
+    position = bisect.bisect_left(sorted_list, item)
+    if position < len(sorted_list) and sorted_list[position] == item:
+        del sorted_list[position]
+
+
+class Autocomplete:
+
+    def __init__(self):
+        self.index = None
+        self.built_at = 0
+        self._building = threading.Lock()
+
+    def suggest(self, query, limit):
+        self._ensure_fresh()
+        return self.index.search(query, limit)
+
+    def _ensure_fresh(self):
+        if self.index is None:
+            with self._building:
+                if self.index is None:
+                    self.rebuild()
+        elif time.monotonic() - self.built_at > MAX_AGE and self._building.acquire(blocking=False):
+            # Other workers' writes only reach this process through a rebuild,
+            # so refresh in the background and keep serving the current index.
+            threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            self._building.release()
+            close_old_connections()
+
+    def rebuild(self):
+        from api import models as api_models
+
+        courses = api_models.Course.objects.published().values_list("id", "title", "slug", "stats__student_count", "stats__rating_count")
+        rows = [("course", pk, title, slug, (students or 0) + (ratings or 0)) for pk, title, slug, students, ratings in courses.iterator()]
+
+        categories = (api_models.Category.objects.filter(active=True)
+                      .annotate(courses_total=models.Count("course"))
+                      .values_list("id", "title", "slug", "courses_total"))
+        rows += [("category", pk, title, slug, courses_total) for pk, title, slug, courses_total in categories.iterator()]
+
+        index = PrefixIndex()
+        index.load(rows)
+        self.index = index
+        self.built_at = time.monotonic()
+
+    def course_changed(self, course):
+        if self.index is None:
+            return
+        if course.platform_status == "Published" and course.teacher_course_status == "Published":
+            stats = getattr(course, "stats", None)
+            score = (stats.student_count + stats.rating_count) if stats else 0
+            self.index.add("course", course.pk, course.title, course.slug, score)
+        else:
+            self.index.remove("course", course.pk)
+
+    def category_changed(self, category):
+        if self.index is None:
+            return
+        if category.active:
+            self.index.add("category", category.pk, category.title, category.slug, category.course_set.count())
+        else:
+            self.index.remove("category", category.pk)
+
+    def removed(self, kind, pk):
+        if self.index is not None:
+            self.index.remove(kind, pk)
+
+
+autocomplete = Autocomplete()
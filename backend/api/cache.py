@@ -0,0 +1,85 @@
+import time
+
+from django.core.cache import caches
+
+
+class TaggedCache:
+    # Each tag has a version counter. Entries are stored together with the
+    # versions of their tags at write time, and invalidating a tag bumps its
+    # counter, so every entry written under an older version stops matching.
+    # Nothing is read-modify-written, so concurrent writers cannot lose each
+    # other's updates.
+
+    def __init__(self, alias, prefix):
+        self.alias = alias
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, key):
+        return f"{self.prefix}:entry:{key}"
+
+    def _tag_key(self, tag):
+        return f"{self.prefix}:tag:{tag}"
+
+    def versions(self, tags):
+        # A missing counter starts from the clock rather than 1, so a counter
+        # evicted by the backend never comes back at a version old entries
+        # were written with.
+        keys = {tag: self._tag_key(tag) for tag in tags}
+        found = self.cache.get_many(list(keys.values()))
+        for key in keys.values():
+            if key not in found:
+                self.cache.add(key, time.time_ns(), timeout=None)
+                found[key] = self.cache.get(key)
+        return {tag: found[key] for tag, key in keys.items()}
+
+    def get(self, key):
+        entry = self.cache.get(self._key(key))
+        if entry is not None:
+            versions, value = entry
+            if self.versions(versions) == versions:
+                self._count("hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value, tags=(), versions=None):
+        # Pass versions read before building the value, so an invalidation
+        # that lands while it is being built is not papered over.
+        if versions is None:
+            versions = self.versions(tags)
+        self.cache.set(self._key(key), (versions, value))
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            try:
+                self.cache.incr(self._tag_key(tag))
+            except ValueError:
+                self.cache.set(self._tag_key(tag), time.time_ns(), timeout=None)
+            self._count("invalidations")
+
+    def _count(self, name, amount=1):
+        key = f"{self.prefix}:stats:{name}"
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key, amount)
+        except ValueError:
+            self.cache.set(key, amount, timeout=None)
+
+    def stats(self):
+        names = ["hits", "misses", "invalidations"]
+        values = self.cache.get_many([f"{self.prefix}:stats:{name}" for name in names])
+        stats = {name: values.get(f"{self.prefix}:stats:{name}", 0) for name in names}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        return stats
+
+
+course_detail_cache = TaggedCache("course_detail", "course-detail")
+
+
+def course_tag(course_id):
+    return f"course:{course_id}"
@@ -0,0 +1,362 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api import models as api_models
+
+SUMMARY_TIMEOUT = getattr(settings, "CART_SUMMARY_TIMEOUT", 60 * 60)
+# Summaries are dropped by whichever process changes the cart, so they live
+# in a cache every process reads.
+SUMMARY_CACHE = getattr(settings, "CART_SUMMARY_CACHE", "cart_summary")
+ZERO = Decimal("0.00")
+# Anonymous carts live in the cart store until checkout and expire after
+# CART_TTL seconds without a change.
+CART_STORE = getattr(settings, "CART_STORE", "api.cart.FileCartStore")
+CART_TTL = getattr(settings, "CART_TTL", 7 * 24 * 60 * 60)
+CART_DIR = getattr(settings, "CART_STORE_DIR", os.path.join(settings.BASE_DIR, "cache", "cart-store"))
+# Updates to one stored cart are serialised; a holder that died is assumed
+# gone after this many seconds.
+LOCK_TIMEOUT = 5
+LOCK_STRIPES = 64
+
+
+class CartStore:
+    # Maps cart_id to {course_id: line}, where a line holds the fields of
+    # the Cart row it becomes at checkout.
+
+    def __init__(self, ttl=CART_TTL):
+        self.ttl = ttl
+
+    def get(self, cart_id):
+        raise NotImplementedError
+
+    def set(self, cart_id, lines):
+        raise NotImplementedError
+
+    def delete(self, cart_id):
+        raise NotImplementedError
+
+    def lock(self, cart_id):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        # Stores whose backend expires entries on its own have nothing to do.
+        return 0
+
+    def update(self, cart_id, change):
+        # Read-modify-write of one cart under its lock, so two quick adds
+        # cannot drop each other's line. change() edits the lines in place.
+        with self.lock(cart_id):
+            lines = self.get(cart_id)
+            result = change(lines)
+            self.set(cart_id, lines)
+        return result
+
+
+class MemoryCartStore(CartStore):
+    # Per-process; suits a single worker or development.
+
+    def __init__(self, ttl=CART_TTL, max_carts=10000):
+        super().__init__(ttl)
+        self.max_carts = max_carts
+        self._carts = OrderedDict()
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def get(self, cart_id):
+        with self._lock:
+            entry = self._carts.get(cart_id)
+            if entry is None:
+                return {}
+            if entry[0] < time.monotonic():
+                del self._carts[cart_id]
+                return {}
+            return dict(entry[1])
+
+    def set(self, cart_id, lines):
+        if not lines:
+            return self.delete(cart_id)
+        with self._lock:
+            self._carts.pop(cart_id, None)
+            self._carts[cart_id] = (time.monotonic() + self.ttl, dict(lines))
+            # Entries are kept in write order, so expired carts and the
+            # least recently changed ones are at the front.
+            now = time.monotonic()
+            while self._carts:
+                oldest_id, (expires, _) = next(iter(self._carts.items()))
+                if expires >= now and len(self._carts) <= self.max_carts:
+                    break
+                del self._carts[oldest_id]
+
+    def delete(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def lock(self, cart_id):
+        return self._update_lock
+
+
+class CacheCartStore(CartStore):
+    # Backed by a Django cache alias, for Redis or Memcached when several
+    # hosts serve the cart.
+
+    def __init__(self, ttl=CART_TTL, alias="carts"):
+        super().__init__(ttl)
+        self.alias = alias
+
+    def key(self, cart_id):
+        return f"cart:{cart_id}"
+
+    def get(self, cart_id):
+        return caches[self.alias].get(self.key(cart_id)) or {}
+
+    def set(self, cart_id, lines):
+        if not lines:
+            return self.delete(cart_id)
+        caches[self.alias].set(self.key(cart_id), lines, self.ttl)
+
+    def delete(self, cart_id):
+        caches[self.alias].delete(self.key(cart_id))
+
+    @contextmanager
+    def lock(self, cart_id):
+        backend = caches[self.alias]
+        if isinstance(backend, FileBasedCache):
+            # add() is check-then-write on this backend, so lock one of a
+            # fixed set of files beside the cache entries instead.
+            with file_lock(backend._dir, cart_id):
+                yield
+            return
+
+        # add() is atomic on Redis, Memcached and locmem. A lock still held
+        # after LOCK_TIMEOUT belongs to a dead worker and has expired.
+        key, token = f"cart-lock:{cart_id}", uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while not backend.add(key, token, LOCK_TIMEOUT) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if backend.get(key) == token:
+                backend.delete(key)
+
+
+class FileCartStore(CartStore):
+    # One JSON file per cart in a directory shared by the workers of a host.
+    # A write touches only its own file, and a cart expires CART_TTL seconds
+    # after its last change (its mtime) rather than being evicted to make
+    # room. Expired files are removed by purge_expired(), run from
+    # manage.py purge_stale_carts.
+
+    def __init__(self, ttl=CART_TTL, directory=CART_DIR):
+        super().__init__(ttl)
+        self.directory = directory
+
+    def name(self, cart_id):
+        # Cart ids come from the client, so files are named by their hash.
+        return hashlib.sha256(cart_id.encode()).hexdigest()
+
+    def path(self, cart_id):
+        name = self.name(cart_id)
+        return os.path.join(self.directory, name[:2], name + ".cart")
+
+    def get(self, cart_id):
+        try:
+            with open(self.path(cart_id), "rb") as f:
+                if os.fstat(f.fileno()).st_mtime + self.ttl < time.time():
+                    return {}
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def set(self, cart_id, lines):
+        if not lines:
+            return self.delete(cart_id)
+        path = self.path(cart_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written beside the target and renamed over it, so a reader never
+        # sees half a cart.
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+            json.dump(lines, f)
+        os.replace(f.name, path)
+
+    def delete(self, cart_id):
+        try:
+            os.remove(self.path(cart_id))
+        except FileNotFoundError:
+            pass
+
+    def lock(self, cart_id):
+        return file_lock(self.directory, self.name(cart_id))
+
+    def purge_expired(self):
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                name, extension = os.path.splitext(filename)
+                if extension not in (".cart", ".tmp"):
+                    continue
+                # Checked again under the cart's lock, so a cart rewritten
+                # after the walk saw it is kept.
+                with file_lock(self.directory, name):
+                    path = os.path.join(root, filename)
+                    try:
+                        if os.stat(path).st_mtime + self.ttl < time.time():
+                            os.remove(path)
+                            removed += extension == ".cart"
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+
+@contextmanager
+def file_lock(directory, key):
+    # One of a fixed set of lock files, so the directory does not fill up
+    # with one lock per cart.
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"cart-{zlib.crc32(key.encode()) % LOCK_STRIPES}.lock")
+    with open(path, "a") as f:
+        locks.lock(f, locks.LOCK_EX)
+        try:
+            yield
+        finally:
+            locks.unlock(f)
+
+
+_store = None
+
+
+def store():
+    global _store
+    if _store is None:
+        _store = import_string(CART_STORE)()
+    return _store
+
+
+def rows(cart_id):
+    # Stored lines as unsaved Cart instances, so they serialize exactly like
+    # Cart rows. Their ids are the negated course id: integers, like row
+    # ids, that can never collide with one.
+    return [
+        api_models.Cart(
+            id=-line["course"], course_id=line["course"], user=None, price=Decimal(line["price"]),
+            tax_fee=Decimal(line["tax_fee"]), total=Decimal(line["total"]), country=line["country"],
+            cart_id=cart_id, date=datetime.fromisoformat(line["date"]),
+        )
+        for line in store().get(cart_id).values()
+    ]
+
+
+def merged(cart_id):
+    # Cart rows and stored lines together, newest first.
+    items = list(api_models.Cart.objects.filter(cart_id=cart_id)) + rows(cart_id)
+    return sorted(items, key=lambda item: (item.date, item.id), reverse=True)
+
+
+def add_line(cart_id, course, price, tax_fee, country):
+    price, tax_fee = Decimal(price), Decimal(tax_fee)
+    line = {
+        "price": str(price),
+        "tax_fee": str(tax_fee),
+        "total": str(price + tax_fee),
+        "country": country,
+        "date": timezone.now().isoformat(),
+        "course": course.id,
+    }
+
+    def change(cart):
+        created = str(course.id) not in cart
+        cart[str(course.id)] = line
+        return created
+
+    return line, store().update(cart_id, change)
+
+
+def remove_line(cart_id, line_id):
+    return store().update(cart_id, lambda cart: cart.pop(str(-int(line_id)), None)) is not None
+
+
+def is_line_id(item_id):
+    return str(item_id).startswith("-")
+
+
+def persist(cart_id, user=None):
+    # Writes the stored lines as Cart rows, at checkout or once the visitor
+    # signs in. The store entry is only dropped when the rows commit.
+    stored = store().get(cart_id)
+    if not stored:
+        return 0
+    existing = set(api_models.Cart.objects.filter(cart_id=cart_id).values_list("course_id", flat=True))
+    rows = [
+        api_models.Cart(
+            course_id=line["course"], user=user, price=line["price"], tax_fee=line["tax_fee"], total=line["total"],
+            country=line["country"], cart_id=cart_id,
+        )
+        for line in stored.values() if line["course"] not in existing
+    ]
+    api_models.Cart.objects.bulk_create(rows)
+    # bulk_create sends no post_save, so the summary is dropped here.
+    invalidate(cart_id)
+    transaction.on_commit(lambda: store().delete(cart_id))
+    return len(rows)
+
+
+def summary_key(cart_id):
+    return f"cart-summary:{cart_id}"
+
+
+def summary(cart_id):
+    data = stored_summary(cart_id)
+    pending = store().get(cart_id).values()
+    if not pending:
+        return data
+    return {
+        "items": data["items"] + len(pending),
+        "price": data["price"] + sum((Decimal(line["price"]) for line in pending), ZERO),
+        "tax": data["tax"] + sum((Decimal(line["tax_fee"]) for line in pending), ZERO),
+        "total": data["total"] + sum((Decimal(line["total"]) for line in pending), ZERO),
+    }
+
+
+def stored_summary(cart_id):
+    key = summary_key(cart_id)
+    cache = caches[SUMMARY_CACHE]
+    data = cache.get(key)
+    if data is None:
+        totals = api_models.Cart.objects.filter(cart_id=cart_id).aggregate(
+            items=Count("id"), price=Sum("price"), tax=Sum("tax_fee"), total=Sum("total"),
+        )
+        data = {
+            "items": totals["items"],
+            "price": totals["price"] or ZERO,
+            "tax": totals["tax"] or ZERO,
+            "total": totals["total"] or ZERO,
+        }
+        cache.set(key, data, SUMMARY_TIMEOUT)
+    return data
+
+
+def invalidate(cart_id):
+    # Deleting again after commit keeps a concurrent read that ran before
+    # the commit from caching the old totals for the full timeout.
+    cache = caches[SUMMARY_CACHE]
+    cache.delete(summary_key(cart_id))
+    transaction.on_commit(lambda: cache.delete(summary_key(cart_id)))
@@ -0,0 +1,33 @@
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    # Views return a tuple of cheap validator parts from get_validators() plus
+    # the last-modified datetime; a matching If-None-Match/If-Modified-Since
+    # is answered with 304 before anything is serialized.
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        parts, last_modified = validators
+        parts = [*parts, request.GET.urlencode(), request.accepted_media_type]
+        etag = quote_etag(hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest())
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        return response
@@ -0,0 +1,119 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from api import models as api_models
+
+# Hot promo codes are served from memory for this long. Caps and windows
+# are enforced again by the UPDATE that claims a use, so a stale entry can
+# only delay a rejection, never allow an extra use.
+CACHE_SECONDS = getattr(settings, "COUPON_CACHE_SECONDS", 30)
+CACHE_SIZE = 1000
+FIELDS = ("id", "code", "teacher_id", "discount", "active", "valid_from", "valid_until", "max_uses", "used_count")
+
+
+class CouponError(Exception):
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CouponCache:
+    # code -> (expires, row or None); unknown codes are cached too, so
+    # guessing attempts do not reach the database either.
+
+    def __init__(self, ttl=CACHE_SECONDS, size=CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, code):
+        entry = self._entries.get(code)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        row = api_models.Coupon.objects.filter(code=code).values(*FIELDS).first()
+        with self._lock:
+            if len(self._entries) >= self.size:
+                self._entries.clear()
+            self._entries[code] = (time.monotonic() + self.ttl, row)
+        return row
+
+    def forget(self, code):
+        with self._lock:
+            self._entries.pop(code, None)
+
+
+coupon_cache = CouponCache()
+
+
+def check(coupon, now=None):
+    now = now or timezone.now()
+    if coupon is None or not coupon["active"]:
+        raise CouponError("Coupon Not Found", 404)
+    if coupon["valid_from"] and coupon["valid_from"] > now:
+        raise CouponError("Coupon is not valid yet")
+    if coupon["valid_until"] and coupon["valid_until"] <= now:
+        raise CouponError("Coupon has expired")
+    if coupon["max_uses"] is not None and coupon["used_count"] >= coupon["max_uses"]:
+        raise CouponError("Coupon usage limit reached")
+
+
+def usable(now):
+    return (
+        Q(active=True)
+        & (Q(valid_from__isnull=True) | Q(valid_from__lte=now))
+        & (Q(valid_until__isnull=True) | Q(valid_until__gt=now))
+        & (Q(max_uses__isnull=True) | Q(used_count__lt=F("max_uses")))
+    )
+
+
+def apply(order_oid, code):
+    # Returns the number of discounted items, 0 when the coupon was already
+    # applied to every item it covers.
+    now = timezone.now()
+    coupon = coupon_cache.get(code)
+    check(coupon, now)
+
+    with transaction.atomic():
+        order = api_models.CartOrder.objects.select_for_update().filter(oid=order_oid).first()
+        if order is None:
+            raise CouponError("Order Not Found", 404)
+
+        matching = api_models.CartOrderItem.objects.filter(order=order, teacher_id=coupon["teacher_id"])
+        items = matching.exclude(coupons_id=coupon["id"])
+        if not items.exists():
+            if matching.exists():
+                return 0
+            raise CouponError("Coupon does not apply to this order")
+
+        # Claims one use only while the coupon is still active, in its
+        # window and under its cap.
+        if not api_models.Coupon.objects.filter(usable(now), pk=coupon["id"]).update(used_count=F("used_count") + 1):
+            coupon_cache.forget(code)
+            raise CouponError("Coupon is no longer available")
+
+        discount = Round(F("total") * (Decimal(coupon["discount"]) / 100), 2)
+        applied = items.update(
+            total=F("total") - discount,
+            price=F("price") - discount,
+            saved=F("saved") + discount,
+            applied_coupon=True,
+            coupons_id=coupon["id"],
+        )
+
+        totals = api_models.CartOrderItem.objects.filter(order=order).aggregate(
+            sub_total=Sum("price"), total=Sum("total"), saved=Sum("saved"),
+        )
+        api_models.CartOrder.objects.filter(pk=order.pk).update(**totals)
+        order.coupons.add(coupon["id"])
+        if order.student_id:
+            api_models.Coupon.used_by.through.objects.get_or_create(coupon_id=coupon["id"], user_id=order.student_id)
+    return applied
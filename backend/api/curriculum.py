@@ -0,0 +1,128 @@
+from django.db.models import F, Prefetch
+from django.urls import reverse
+from django.utils import timezone
+
+from api import hls
+from api import models as api_models
+
+
+def build(course_id):
+    items = api_models.VariantItem.objects.order_by("id")
+    variants = (api_models.Variant.objects.filter(course_id=course_id).order_by("id")
+                .prefetch_related(Prefetch("variant_items", queryset=items)))
+
+    sections = []
+    total_duration = 0
+    lecture_count = 0
+    for variant in variants:
+        section_items = []
+        for item in variant.variant_items.all():
+            duration = item.duration.total_seconds() if item.duration else None
+            total_duration += duration or 0
+            lecture_count += 1
+            section_items.append({
+                "id": item.id,
+                "variant_item_id": item.variant_item_id,
+                "title": item.title,
+                "description": item.description,
+                "file": item.file.name or None,
+                "duration": duration,
+                "content_duration": item.content_duration,
+                "preview": item.preview,
+                "poster": item.poster.name or None,
+                "media_status": item.media_status,
+                "hls_manifest": item.hls_manifest.name if item.hls_status == "Ready" else None,
+            })
+        sections.append({
+            "id": variant.id,
+            "variant_id": variant.variant_id,
+            "title": variant.title,
+            "variant_items": section_items,
+        })
+
+    return {"sections": sections, "total_duration": total_duration, "lecture_count": lecture_count}
+
+
+def get_snapshot(course):
+    snapshot = getattr(course, "curriculum_snapshot", None)
+    if snapshot is None:
+        snapshot, _ = api_models.CurriculumSnapshot.objects.get_or_create(course_id=course.pk)
+
+    if snapshot.stale:
+        # Clear the flag before reading the tree: a change landing while we
+        # build marks it stale again instead of being overwritten.
+        claimed = api_models.CurriculumSnapshot.objects.filter(pk=snapshot.pk, stale=True).update(stale=False)
+        if claimed:
+            try:
+                snapshot.data = build(course.pk)
+            except Exception:
+                # Hand the claim back, so the next request rebuilds rather
+                # than serving the old tree as fresh.
+                mark_stale(course.pk)
+                raise
+            snapshot.stale = False
+            snapshot.version += 1
+            api_models.CurriculumSnapshot.objects.filter(pk=snapshot.pk).update(
+                data=snapshot.data, version=F("version") + 1, updated=timezone.now(),
+            )
+        else:
+            snapshot.refresh_from_db(fields=["version", "stale", "data"])
+
+    course.curriculum_snapshot = snapshot
+    return snapshot
+
+
+def mark_stale(course_id):
+    api_models.CurriculumSnapshot.objects.filter(course_id=course_id).update(stale=True)
+
+
+def render_sections(snapshot, request=None):
+    # The snapshot only records which media an item has; every URL handed
+    # out points at the enrollment-checked lesson endpoints, never at
+    # storage, since the same sections are shown to visitors.
+    sections = []
+    for section in snapshot.data.get("sections", []):
+        items = []
+        for item in section["variant_items"]:
+            stream = _stream_url(item, request)
+            items.append({
+                **item,
+                "file": stream,
+                "poster": _poster_url(item, request),
+                "hls_manifest": _hls_url(item, request),
+                "stream": stream,
+            })
+        sections.append({**section, "variant_items": items})
+    return sections
+
+
+def _stream_url(item, request):
+    # Range-capable, enrollment-checked endpoint for the lesson file.
+    if not item["file"]:
+        return None
+    url = reverse("lesson-media", kwargs={"variant_item_id": item["variant_item_id"]})
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def _poster_url(item, request):
+    if not item.get("poster"):
+        return None
+    url = reverse("lesson-poster", kwargs={"variant_item_id": item["variant_item_id"]})
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def _hls_url(item, request):
+    # The master playlist through the gated endpoint; its segments are
+    # fetched through the same endpoint, never straight from storage.
+    if not item.get("hls_manifest"):
+        return None
+    url = reverse("lesson-hls", kwargs={"variant_item_id": item["variant_item_id"], "name": hls.MASTER_PLAYLIST})
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def summary(snapshot):
+    return {
+        "version": snapshot.version,
+        "total_duration": snapshot.data.get("total_duration", 0),
+        "lecture_count": snapshot.data.get("lecture_count", 0),
+    }
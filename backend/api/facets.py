@@ -0,0 +1,102 @@
+from functools import reduce
+import operator
+
+from django.db.models import Count, Q
+
+from api import models as api_models
+
+PRICE_BUCKETS = {
+    "free": ("Free", Q(price = 0)),
+    "under-20": ("Under 20", Q(price__gt = 0, price__lt = 20)),
+    "20-50": ("20 to 50", Q(price__gte = 20, price__lt = 50)),
+    "50-100": ("50 to 100", Q(price__gte = 50, price__lt = 100)),
+    "100-plus": ("100 and more", Q(price__gte = 100)),
+}
+
+RATING_THRESHOLDS = (4.5, 4.0, 3.5, 3.0)
+
+BOOLEAN_VALUES = {"true": True, "1": True, "false": False, "0": False}
+
+
+class FacetError(ValueError):
+    pass
+
+
+def _values(params, name):
+    return [value for raw in params.getlist(name) for value in raw.split(",") if value]
+
+
+def parse_filters(params):
+    # One Q per facet; several values inside one facet are OR'ed together.
+    filters = {}
+
+    categories = _values(params, "category")
+    if categories:
+        filters["category"] = Q(category__slug__in = categories)
+
+    languages = _values(params, "language")
+    if languages:
+        filters["language"] = Q(language__in = languages)
+
+    levels = _values(params, "level")
+    if levels:
+        filters["level"] = Q(level__in = levels)
+
+    featured = params.get("featured")
+    if featured:
+        if featured.lower() not in BOOLEAN_VALUES:
+            raise FacetError("featured must be true or false")
+        filters["featured"] = Q(featured = BOOLEAN_VALUES[featured.lower()])
+
+    prices = _values(params, "price")
+    if prices:
+        unknown = set(prices) - set(PRICE_BUCKETS)
+        if unknown:
+            raise FacetError(f"Unknown price bucket: {', '.join(sorted(unknown))}")
+        filters["price"] = reduce(operator.or_, (PRICE_BUCKETS[price][1] for price in prices))
+
+    min_rating = params.get("min_rating")
+    if min_rating:
+        try:
+            filters["min_rating"] = Q(stats__average_rating__gte = float(min_rating))
+        except ValueError:
+            raise FacetError("min_rating must be a number")
+
+    return filters
+
+
+def apply_filters(queryset, filters):
+    for condition in filters.values():
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def facet_counts(queryset, filters):
+    # Disjunctive faceting in one grouped query: each value is counted with
+    # every selected filter applied except the one of its own facet, using
+    # COUNT(...) FILTER (WHERE ...) aggregates.
+    categories = list(api_models.Category.objects.filter(active = True).values_list("slug", "title"))
+
+    options = {
+        "category": [(slug, title, Q(category__slug = slug)) for slug, title in categories],
+        "language": [(value, label, Q(language = value)) for value, label in api_models.LANGUAGE],
+        "level": [(value, label, Q(level = value)) for value, label in api_models.LEVEL],
+        "featured": [("true", "Featured", Q(featured = True)), ("false", "Not featured", Q(featured = False))],
+        "price": [(value, label, condition) for value, (label, condition) in PRICE_BUCKETS.items()],
+        "min_rating": [(str(rating), f"{rating}+", Q(stats__average_rating__gte = rating)) for rating in RATING_THRESHOLDS],
+    }
+
+    aggregates = {}
+    for facet, values in options.items():
+        others = [condition for name, condition in filters.items() if name != facet]
+        for index, (_, _, condition) in enumerate(values):
+            aggregates[f"{facet}__{index}"] = Count("id", filter = reduce(operator.and_, others, condition))
+
+    counts = queryset.aggregate(**aggregates)
+    return {
+        facet: [
+            {"value": value, "label": label, "count": counts[f"{facet}__{index}"]}
+            for index, (value, label, _) in enumerate(values)
+        ]
+        for facet, values in options.items()
+    }
@@ -0,0 +1,173 @@
+import os
+import posixpath
+import re
+import subprocess
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+
+from api import media, mediainfo
+from api import models as api_models
+
+# (name, height, video kbps, audio kbps), largest first. Only rungs at or
+# below the source height are encoded.
+RENDITIONS = getattr(settings, "HLS_RENDITIONS", (
+    ("1080p", 1080, 5000, 192),
+    ("720p", 720, 2800, 128),
+    ("480p", 480, 1400, 128),
+    ("360p", 360, 800, 96),
+    ("240p", 240, 400, 64),
+))
+SEGMENT_SECONDS = getattr(settings, "HLS_SEGMENT_SECONDS", 4)
+PACKAGE_TIMEOUT = getattr(settings, "HLS_PACKAGE_TIMEOUT", 60 * 60)
+DEFAULT_HEIGHT = 720
+MASTER_PLAYLIST = "master.m3u8"
+URI_RE = re.compile(r'URI="([^"]*)"')
+
+
+def claim(limit):
+    return media.claim(limit, stage="hls", lease=PACKAGE_TIMEOUT + 5 * 60)
+
+
+def process(item_id, threads=0):
+    item = api_models.VariantItem.objects.filter(id=item_id, hls_status="Processing").first()
+    if item is None:
+        return None
+
+    try:
+        source = media.media_source(item.file)
+        height, has_audio = source_info(item.file, source)
+        with tempfile.TemporaryDirectory() as workdir:
+            result = subprocess.run(
+                command(source, workdir, ladder(height), has_audio, threads),
+                capture_output=True, timeout=PACKAGE_TIMEOUT,
+            )
+            if result.returncode:
+                raise RuntimeError(result.stderr.decode(errors="replace").strip()[-2000:])
+            manifest = upload(item, workdir)
+    except Exception as e:
+        return media.fail(item, e, stage="hls")
+
+    # A replaced package is deleted by the VariantItem signals. When the
+    # file itself was replaced meanwhile, this package belongs to no row.
+    status = media.finish(item, "hls", {
+        "hls_manifest": manifest, "hls_status": "Ready", "hls_error": None, "hls_next_attempt": None,
+    })
+    if status is None:
+        delete_package(item.hls_manifest.storage, manifest)
+    return status
+
+
+def source_info(fieldfile, source):
+    info = mediainfo.read(fieldfile)
+    if info and info["height"]:
+        return info["height"], bool(info["audio_codec"])
+
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    infos = ffmpeg_parse_infos(source)
+    size = infos.get("video_size")
+    return (size[1] if size else None), infos.get("audio_found", False)
+
+
+def ladder(height):
+    height = height or DEFAULT_HEIGHT
+    fitting = [rendition for rendition in RENDITIONS if rendition[1] <= height]
+    return fitting or [min(RENDITIONS, key=lambda rendition: rendition[1])]
+
+
+def command(source, workdir, renditions, has_audio, threads=0):
+    from moviepy.config import get_setting
+
+    # One decode feeds every rung; keyframes are forced on segment
+    # boundaries so all renditions switch at the same points.
+    outputs = "".join(f"[v{index}]" for index in range(len(renditions)))
+    graph = [f"[0:v]split={len(renditions)}{outputs}"]
+    graph += [f"[v{index}]scale=-2:{height}[v{index}out]" for index, (_, height, _, _) in enumerate(renditions)]
+
+    args = [get_setting("FFMPEG_BINARY"), "-v", "error", "-y", "-i", source, "-filter_complex", ";".join(graph)]
+    streams = []
+    for index, (name, _, video_kbps, audio_kbps) in enumerate(renditions):
+        args += [
+            "-map", f"[v{index}out]", f"-c:v:{index}", "libx264", f"-b:v:{index}", f"{video_kbps}k",
+            f"-maxrate:v:{index}", f"{video_kbps * 107 // 100}k", f"-bufsize:v:{index}", f"{video_kbps * 3 // 2}k",
+        ]
+        if has_audio:
+            args += ["-map", "0:a:0", f"-c:a:{index}", "aac", f"-b:a:{index}", f"{audio_kbps}k"]
+            streams.append(f"v:{index},a:{index},name:{name}")
+        else:
+            streams.append(f"v:{index},name:{name}")
+
+    if has_audio:
+        args += ["-ac", "2"]
+    args += [
+        "-preset", "veryfast", "-profile:v", "main", "-pix_fmt", "yuv420p", "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})",
+        "-threads", str(threads),
+        "-f", "hls", "-hls_time", str(SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(workdir, "%v", "segment_%04d.ts"),
+        "-master_pl_name", MASTER_PLAYLIST, "-var_stream_map", " ".join(streams),
+        os.path.join(workdir, "%v", "index.m3u8"),
+    ]
+    return args
+
+
+def upload(item, workdir):
+    # Playlists reference segments by relative path, so the tree keeps its
+    # layout under a fresh prefix per packaging run.
+    storage = item.hls_manifest.storage
+    prefix = posixpath.join(item.hls_manifest.field.upload_to, item.variant_item_id, uuid.uuid4().hex[:12])
+    for root, _, files in os.walk(workdir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = posixpath.join(prefix, *os.path.relpath(path, workdir).split(os.sep))
+            with open(path, "rb") as f:
+                storage.save(name, File(f))
+    return posixpath.join(prefix, MASTER_PLAYLIST)
+
+
+def package_name(manifest, name):
+    # Resolves a path requested relative to the master playlist, refusing
+    # anything outside the package directory.
+    directory = posixpath.dirname(manifest)
+    resolved = posixpath.normpath(posixpath.join(directory, name))
+    if not resolved.startswith(directory + "/"):
+        return None
+    return resolved
+
+
+def rewrite_playlist(text, query):
+    # Playlists name their children by relative path, which the player
+    # resolves against the gated endpoint. Players that authenticate with
+    # ?token= need it carried onto every child URI as well.
+    if not query:
+        return text
+
+    def with_query(uri):
+        return f"{uri}{'&' if '?' in uri else '?'}{query}"
+
+    lines = []
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            line = with_query(line.strip())
+        elif 'URI="' in line:
+            line = URI_RE.sub(lambda match: f'URI="{with_query(match.group(1))}"', line)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def delete_package(storage, manifest):
+    def delete_tree(directory):
+        try:
+            directories, files = storage.listdir(directory)
+        except FileNotFoundError:
+            return
+        for filename in files:
+            storage.delete(posixpath.join(directory, filename))
+        for child in directories:
+            delete_tree(posixpath.join(directory, child))
+
+    delete_tree(posixpath.dirname(manifest))
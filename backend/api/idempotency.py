@@ -0,0 +1,131 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from api import models as api_models
+
+HEADER = "Idempotency-Key"
+TTL = timedelta(seconds=getattr(settings, "IDEMPOTENCY_TTL", 24 * 60 * 60))
+# A running request holds its key for this long. It should be longer than
+# the worker timeout, so a placeholder left by a killed worker is taken
+# over by the next retry instead of blocking the key until it expires.
+LEASE = timedelta(seconds=getattr(settings, "IDEMPOTENCY_LEASE_SECONDS", 60))
+# Duplicates of a request still running are told to come back after this
+# many seconds rather than held in a worker.
+RETRY_AFTER = 1
+
+
+def record_key(request, key):
+    user = request.user.pk if request.user and request.user.is_authenticated else "-"
+    return hashlib.sha256(f"{request.method} {request.path}\n{user}\n{key}".encode()).hexdigest()
+
+
+def request_hash(request):
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def execute(request, key, view):
+    # Runs view() once per key. The first caller holds a leased placeholder
+    # row; replays return the stored response and duplicates that arrive
+    # while it runs get a 409 with Retry-After.
+    digest = record_key(request, key)
+    body_hash = request_hash(request)
+    now = timezone.now()
+    api_models.IdempotencyRecord.objects.filter(key=digest, expires__lt=now).delete()
+    record = claim(digest, body_hash, now)
+    if record is None:
+        return replay(digest, body_hash)
+
+    try:
+        response = view()
+    except Exception:
+        release(record)
+        raise
+    if response.status_code >= 500:
+        # Server errors are not final; let the client's retry run again.
+        release(record)
+        return response
+
+    # Stored only while this caller still holds the lease, so a request that
+    # outlived it cannot overwrite the result of the one that took over.
+    body = JSONRenderer().render(response.data).decode() if response.data is not None else None
+    api_models.IdempotencyRecord.objects.filter(pk=record.pk, locked_until=record.locked_until).update(
+        status_code=response.status_code, body=body, locked_until=None,
+    )
+    return response
+
+
+def claim(digest, body_hash, now):
+    # Returns the placeholder this caller now holds, or None when another
+    # request holds the key or has already finished it.
+    locked_until = now + LEASE
+    try:
+        with transaction.atomic():
+            return api_models.IdempotencyRecord.objects.create(
+                key=digest, request_hash=body_hash, expires=now + TTL, locked_until=locked_until,
+            )
+    except IntegrityError:
+        pass
+    # A placeholder whose lease has run out (or that predates leases) was
+    # left by a worker killed mid-request; the first retry takes it over.
+    stale = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    taken = api_models.IdempotencyRecord.objects.filter(
+        stale, key=digest, request_hash=body_hash, status_code__isnull=True,
+    ).update(locked_until=locked_until)
+    if taken:
+        return api_models.IdempotencyRecord.objects.filter(key=digest, locked_until=locked_until).first()
+    return None
+
+
+def release(record):
+    api_models.IdempotencyRecord.objects.filter(pk=record.pk, locked_until=record.locked_until).delete()
+
+
+def replay(digest, body_hash):
+    record = api_models.IdempotencyRecord.objects.filter(key=digest).first()
+    if record is None:
+        # The first request failed and released the key.
+        return retry_later("The original request failed, retry it")
+    if record.request_hash != body_hash:
+        return Response({"message": f"{HEADER} was already used with a different request"}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is None:
+        return retry_later("The original request is still in progress")
+    response = Response(json.loads(record.body) if record.body else None, status=record.status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def retry_later(message):
+    response = Response({"message": message}, status=status.HTTP_409_CONFLICT)
+    response["Retry-After"] = str(RETRY_AFTER)
+    return response
+
+
+def purge(batch_size=1000):
+    deleted = 0
+    while True:
+        ids = list(api_models.IdempotencyRecord.objects.filter(expires__lt=timezone.now())
+                   .values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += api_models.IdempotencyRecord.objects.filter(id__in=ids).delete()[0]
+
+
+class IdempotentMixin:
+    # Add to a view to honour the Idempotency-Key header on POST.
+
+    def post(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return super().post(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"message": f"{HEADER} must be at most 255 characters"}, status=status.HTTP_400_BAD_REQUEST)
+        return execute(request, key, lambda: super(IdempotentMixin, self).post(request, *args, **kwargs))
@@ -0,0 +1,141 @@
+import hashlib
+import posixpath
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from api import models as api_models
+from userauths.models import Profile
+
+WIDTHS = getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", (160, 320, 640, 1024, 1600))
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+CACHE_BYTES = getattr(settings, "IMAGE_DERIVATIVE_CACHE_BYTES", 1024 ** 3)
+# last_used is only rewritten when older than this, so hot images do not
+# cost a write per request.
+TOUCH_INTERVAL = timedelta(hours=1)
+IMAGE_MODELS = [api_models.Course, api_models.Teacher, api_models.Category, Profile]
+# How long clients may reuse the redirect to a derivative. Kept short so a
+# replaced source image shows up within minutes.
+REDIRECT_MAX_AGE = getattr(settings, "IMAGE_REDIRECT_MAX_AGE", 300)
+
+
+def srcset(name, request=None):
+    url = reverse("image-derivative", kwargs={"name": name})
+    if request is not None:
+        url = request.build_absolute_uri(url)
+    return {
+        fmt: ", ".join(f"{url}?w={width}&fmt={fmt} {width}w" for width in WIDTHS)
+        for fmt in FORMATS
+    }
+
+
+def get_derivative(source, width, fmt):
+    derivative = api_models.ImageDerivative.objects.filter(source=source, width=width, format=fmt).first()
+    if derivative is not None:
+        now = timezone.now()
+        if derivative.last_used < now - TOUCH_INTERVAL:
+            api_models.ImageDerivative.objects.filter(pk=derivative.pk).update(last_used=now)
+        return derivative
+
+    # Only images some model points at can be rendered, so the endpoint
+    # cannot be used to read arbitrary storage paths.
+    if not any(model.objects.filter(image=source).exists() for model in IMAGE_MODELS):
+        return None
+
+    try:
+        name, size = render(source, width, fmt)
+    except (OSError, Image.DecompressionBombError):
+        # Missing from storage or not a decodable image.
+        return None
+    try:
+        with transaction.atomic():
+            return api_models.ImageDerivative.objects.create(source=source, width=width, format=fmt, file=name, size=size)
+    except IntegrityError:
+        # Another request rendered the same derivative first.
+        return api_models.ImageDerivative.objects.get(source=source, width=width, format=fmt)
+
+
+def render(source, width, fmt):
+    image_format, extension, options = FORMATS[fmt]
+    with default_storage.open(source, "rb") as f:
+        data = f.read()
+
+    # Named after the source bytes, so identical uploads (default avatars,
+    # re-uploads) share one file per width and format.
+    digest = hashlib.sha256(data).hexdigest()
+    name = posixpath.join(
+        api_models.ImageDerivative._meta.get_field("file").upload_to,
+        digest[:2], f"{digest[:32]}-{width}.{extension}",
+    )
+    if default_storage.exists(name):
+        return name, default_storage.size(name)
+
+    image = Image.open(BytesIO(data))
+    if image.format == "JPEG":
+        # Let libjpeg decode at a reduced scale instead of full resolution.
+        image.draft("RGB", (width, max(1, image.height * width // image.width)))
+    image = ImageOps.exif_transpose(image)
+    if image.width > width:
+        image.thumbnail((width, image.height * width // image.width + 1), Image.LANCZOS)
+
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = flatten(image)
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+    output = BytesIO()
+    image.save(output, image_format, **options)
+    name = default_storage.save(name, ContentFile(output.getvalue()))
+    return name, output.tell()
+
+
+def flatten(image):
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def redirect_cache_control(storage=default_storage):
+    # A redirect to a signed URL must not outlive the signature, and is
+    # specific to this client, so shared caches may not keep it.
+    if getattr(storage, "querystring_auth", False):
+        return f"private, max-age={min(REDIRECT_MAX_AGE, storage.querystring_expire // 2)}"
+    return f"public, max-age={REDIRECT_MAX_AGE}"
+
+
+def forget(source):
+    api_models.ImageDerivative.objects.filter(source=source).delete()
+
+
+def prune(max_bytes=CACHE_BYTES):
+    # Drops least recently used derivatives until the cache fits, then
+    # removes files no remaining row points at.
+    total = api_models.ImageDerivative.objects.aggregate(total=Sum("size"))["total"] or 0
+    evicted = []
+    if total > max_bytes:
+        for pk, name, size in api_models.ImageDerivative.objects.order_by("last_used").values_list("id", "file", "size").iterator():
+            evicted.append((pk, name))
+            total -= size
+            if total <= max_bytes:
+                break
+
+    ids = [pk for pk, _ in evicted]
+    for start in range(0, len(ids), 500):
+        api_models.ImageDerivative.objects.filter(id__in=ids[start:start + 500]).delete()
+    names = {name for _, name in evicted}
+    names -= set(api_models.ImageDerivative.objects.filter(file__in=names).values_list("file", flat=True))
+    for name in names:
+        default_storage.delete(name)
+    return len(ids), total
@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import hls, media
+from api import models as api_models
+
+
+class Command(BaseCommand):
+    help = "Package ready lesson videos into multi-rendition HLS using a pool of ffmpeg workers."
+
+    def add_arguments(self, parser):
+        cpus = os.cpu_count() or 1
+        parser.add_argument("--workers", type=int, default=max(1, cpus // 2))
+        parser.add_argument("--threads", type=int, default=0, help="ffmpeg threads per job (default: cores / workers).")
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+        parser.add_argument("--poll", type=float, default=10.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--enqueue", action="store_true", help="Queue processed videos that were never packaged.")
+
+    def handle(self, *args, **options):
+        if options["enqueue"]:
+            self.enqueue()
+
+        workers = max(1, options["workers"])
+        threads = options["threads"] or max(1, (os.cpu_count() or 1) // workers)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+            while True:
+                ids = hls.claim(workers)
+                connections.close_all()
+                if not ids:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll"])
+                    continue
+
+                for item_id, status in zip(ids, pool.map(partial(_process, threads=threads), ids)):
+                    self.stdout.write(f"VariantItem {item_id}: {status}")
+
+    def enqueue(self):
+        items = (api_models.VariantItem.objects.filter(media_status="Ready", hls_status__isnull=True)
+                 .exclude(file="").only("id", "file"))
+        ids = [item.id for item in items.iterator() if media.media_kind(item.file.name) == "video"]
+        api_models.VariantItem.objects.filter(id__in=ids).update(
+            hls_status="Pending", hls_attempts=0, hls_error=None, hls_next_attempt=None,
+        )
+        self.stdout.write(f"Queued {len(ids)} videos for packaging")
+
+
+def _process(item_id, threads):
+    try:
+        return hls.process(item_id, threads)
+    finally:
+        connections.close_all()
@@ -0,0 +1,61 @@
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Answers the two PayPal calls the checkout makes. Order ids starting
+    # with "FAIL" come back APPROVED (not captured), "MISSING" gives 404.
+    protocol_version = "HTTP/1.1"
+    delay = 0
+    token_ttl = 32400
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path != "/v1/oauth2/token":
+            return self.reply(404, {"name": "RESOURCE_NOT_FOUND"})
+        self.reply(200, {"access_token": uuid.uuid4().hex, "token_type": "Bearer", "expires_in": self.token_ttl})
+
+    def do_GET(self):
+        prefix = "/v2/checkout/orders/"
+        if not self.path.startswith(prefix):
+            return self.reply(404, {"name": "RESOURCE_NOT_FOUND"})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self.reply(401, {"error": "invalid_token"})
+        order_id = self.path[len(prefix):]
+        if order_id.startswith("MISSING"):
+            return self.reply(404, {"name": "RESOURCE_NOT_FOUND"})
+        self.reply(200, {"id": order_id, "status": "APPROVED" if order_id.startswith("FAIL") else "COMPLETED"})
+
+    def reply(self, status, payload):
+        time.sleep(self.delay)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in for the PayPal REST API (set PAYPAL_API_BASE to its address)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--delay", type=float, default=0, help="Seconds to wait before each response.")
+        parser.add_argument("--token-ttl", type=int, default=32400)
+
+    def handle(self, *args, **options):
+        handler = type("Handler", (StubHandler,), {"delay": options["delay"], "token_ttl": options["token_ttl"]})
+        server = ThreadingHTTPServer((options["host"], options["port"]), handler)
+        self.stdout.write(self.style.SUCCESS(f"PayPal stub listening on http://{options['host']}:{options['port']}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import media
+
+
+class Command(BaseCommand):
+    help = "Probe uploaded lecture files for duration and poster frames using a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+        parser.add_argument("--poll", type=float, default=5.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+        # Spawned workers set Django up from scratch, so no database
+        # connection is ever shared with the parent.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+            while True:
+                ids = media.claim(workers * 2)
+                connections.close_all()
+                if not ids:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll"])
+                    continue
+
+                for item_id, status in zip(ids, pool.map(_process, ids)):
+                    self.stdout.write(f"VariantItem {item_id}: {status}")
+
+
+def _process(item_id):
+    try:
+        return media.process(item_id)
+    finally:
+        connections.close_all()
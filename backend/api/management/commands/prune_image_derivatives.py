@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import images
+
+
+class Command(BaseCommand):
+    help = "Evict least recently used image derivatives until the cache fits its byte budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-bytes", type=int, default=images.CACHE_BYTES)
+
+    def handle(self, *args, **options):
+        evicted, total = images.prune(options["max_bytes"])
+        self.stdout.write(self.style.SUCCESS(f"Evicted {evicted} derivatives, {total} bytes cached"))
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import cart as api_cart
+from api import models as api_models
+
+
+class Command(BaseCommand):
+    help = "Delete anonymous Cart rows that have not changed for a number of days, and expired stored carts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the stale rows.")
+
+    def handle(self, *args, **options):
+        stale = api_models.Cart.objects.filter(user__isnull = True, date__lt = timezone.now() - timedelta(days = options["days"]))
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"{stale.count()} stale cart rows"))
+            return
+
+        # Short batches keep each delete's locks and the signal fan-out small
+        # on a table the storefront is writing to.
+        deleted = 0
+        while True:
+            batch = list(stale.order_by("id").values_list("id", flat = True)[:options["batch_size"]])
+            if not batch:
+                break
+            api_models.Cart.objects.filter(id__in = batch).delete()
+            deleted += len(batch)
+            self.stdout.write(f"Deleted {deleted} rows")
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} stale cart rows"))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {api_cart.store().purge_expired()} expired stored carts"))
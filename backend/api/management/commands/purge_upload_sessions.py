@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api import uploads
+
+
+class Command(BaseCommand):
+    help = "Abort chunked uploads whose session expired before finalize."
+
+    def handle(self, *args, **options):
+        count = uploads.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Aborted {count} expired upload sessions"))
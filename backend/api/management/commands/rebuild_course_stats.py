@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from api import models as api_models
+
+
+class Command(BaseCommand):
+    help = "Recompute CourseStats from reviews, enrollments and lectures, reporting any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report drift, do not write.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        course_ids = list(api_models.Course.objects.order_by("id").values_list("id", flat=True))
+        batch_size = options["batch_size"]
+        drifted = 0
+
+        for start in range(0, len(course_ids), batch_size):
+            batch = course_ids[start:start + batch_size]
+            fresh = api_models.CourseStats.compute(batch)
+            existing = {stats.course_id: stats for stats in api_models.CourseStats.objects.filter(course__in = batch)}
+
+            to_create = []
+            to_update = []
+            for course_id, values in fresh.items():
+                stats = existing.get(course_id)
+                if stats is None:
+                    drifted += 1
+                    self.stdout.write(f"Course {course_id}: missing stats row")
+                    to_create.append(api_models.CourseStats(course_id = course_id, **values))
+                    continue
+
+                changed = {field: (getattr(stats, field), value) for field, value in values.items() if not _same(getattr(stats, field), value)}
+                if changed:
+                    drifted += 1
+                    self.stdout.write(f"Course {course_id}: {changed}")
+                    for field, value in values.items():
+                        setattr(stats, field, value)
+                    to_update.append(stats)
+
+            if not options["check"]:
+                api_models.CourseStats.objects.bulk_create(to_create)
+                if to_update:
+                    api_models.CourseStats.objects.bulk_update(to_update, list(values))
+
+        verb = "found" if options["check"] else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{drifted} of {len(course_ids)} courses {verb} with drift"))
+
+
+def _same(current, fresh):
+    if current is None or fresh is None:
+        return current == fresh
+    return abs(current - fresh) < 1e-9
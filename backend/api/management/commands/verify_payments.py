@@ -0,0 +1,39 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import payments
+
+
+class Command(BaseCommand):
+    help = "Verify queued payments with PayPal and fulfil paid orders using a pool of worker threads."
+
+    def add_arguments(self, parser):
+        # Verification waits on PayPal rather than the CPU, so threads are
+        # enough and share one pooled PayPal client.
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                ids = payments.claim(workers * 2)
+                if not ids:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll"])
+                    continue
+
+                for verification_id, status in zip(ids, pool.map(_process, ids)):
+                    self.stdout.write(f"PaymentVerification {verification_id}: {status}")
+
+
+def _process(verification_id):
+    try:
+        return payments.process(verification_id)
+    finally:
+        connections.close_all()
@@ -0,0 +1,179 @@
+import mimetypes
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from api import mediainfo
+from api import models as api_models
+
+MAX_ATTEMPTS = getattr(settings, "MEDIA_MAX_ATTEMPTS", 5)
+RETRY_DELAY = getattr(settings, "MEDIA_RETRY_DELAY", 30)
+LEASE_SECONDS = getattr(settings, "MEDIA_LEASE_SECONDS", 15 * 60)
+POSTER_AT = 1.0
+POSTER_TIMEOUT = 120
+COPY_CHUNK = 1024 * 1024
+
+
+def claim(limit, stage="media", lease=LEASE_SECONDS):
+    # Pending items whose retry time has come, plus Processing items whose
+    # lease ran out because the worker holding them died. `stage` is the
+    # field prefix of the job ("media" or "hls").
+    status, attempts, next_attempt = f"{stage}_status", f"{stage}_attempts", f"{stage}_next_attempt"
+    now = timezone.now()
+    due = Q(**{f"{next_attempt}__isnull": True}) | Q(**{f"{next_attempt}__lte": now})
+    ready = Q(**{status: "Pending"}) & due | Q(**{status: "Processing", f"{next_attempt}__lte": now})
+    with transaction.atomic():
+        ids = list(api_models.VariantItem.objects.select_for_update(skip_locked=True)
+                   .filter(ready).order_by(next_attempt, "id")
+                   .values_list("id", flat=True)[:limit])
+        api_models.VariantItem.objects.filter(id__in=ids).update(**{
+            status: "Processing",
+            attempts: F(attempts) + 1,
+            next_attempt: now + timedelta(seconds=lease),
+        })
+    return ids
+
+
+def process(item_id):
+    item = api_models.VariantItem.objects.filter(id=item_id, media_status="Processing").first()
+    if item is None:
+        return None
+    if not item.file:
+        item.media_status = None
+        item.media_next_attempt = None
+        item.save(update_fields=["media_status", "media_next_attempt"])
+        return item.media_status
+
+    changes = {}
+    try:
+        info = mediainfo.read(item.file)
+        kind = info["kind"] if info else media_kind(item.file.name)
+        duration = info["duration_ms"] / 1000 if info and info["duration_ms"] else None
+        if kind and duration is None:
+            # Containers the header reader does not understand go through
+            # ffmpeg, which needs the whole file on disk.
+            with local_copy(item.file) as path:
+                duration = probe(path, kind)
+
+        if duration is not None:
+            changes["duration"] = timedelta(seconds=duration)
+            changes["content_duration"] = format_duration(duration)
+        if kind == "video":
+            # Queue adaptive-bitrate packaging (manage.py package_hls).
+            changes.update(hls_status="Pending", hls_attempts=0, hls_error=None, hls_next_attempt=None)
+            with tempfile.TemporaryDirectory() as workdir:
+                poster_path = os.path.join(workdir, "poster.jpg")
+                extract_poster(media_source(item.file), poster_path, min(POSTER_AT, (duration or 0) / 2))
+                if os.path.exists(poster_path):
+                    # Assigned rather than saved here, so the upload happens in
+                    # the final save and the signals release the previous poster.
+                    with open(poster_path, "rb") as poster:
+                        name = f"{os.path.splitext(os.path.basename(item.file.name))[0]}-poster.jpg"
+                        changes["poster"] = ContentFile(poster.read(), name=name)
+    except Exception as e:
+        return fail(item, e)
+
+    changes.update(media_status="Ready", media_error=None, media_next_attempt=None)
+    return finish(item, "media", changes)
+
+
+def finish(item, stage, changes):
+    # Saves a job's result only if the item still holds the file that was
+    # processed and the job still owns it. A file replaced meanwhile is
+    # queued again by VariantItem.save(), so the stale result or error is
+    # dropped (along with any upload it carried) and the new file gets its
+    # own run.
+    status = f"{stage}_status"
+    with transaction.atomic():
+        current = (api_models.VariantItem.objects.select_for_update()
+                   .filter(id=item.id, file=item.file.name, **{status: "Processing"}).first())
+        if current is None:
+            return None
+        for field, value in changes.items():
+            setattr(current, field, value)
+        current.save(update_fields=list(changes))
+    return getattr(current, status)
+
+
+def fail(item, error, stage="media"):
+    attempts = getattr(item, f"{stage}_attempts")
+    changes = {f"{stage}_error": f"{type(error).__name__}: {error}"}
+    if attempts >= MAX_ATTEMPTS:
+        changes.update({f"{stage}_status": "Failed", f"{stage}_next_attempt": None})
+    else:
+        changes.update({
+            f"{stage}_status": "Pending",
+            f"{stage}_next_attempt": timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (attempts - 1)),
+        })
+    return finish(item, stage, changes)
+
+
+def media_kind(name):
+    mime, _ = mimetypes.guess_type(name)
+    if mime and mime.split("/")[0] in ("video", "audio"):
+        return mime.split("/")[0]
+    return None
+
+
+@contextmanager
+def local_copy(fieldfile):
+    # moviepy needs a local path, so remote storages (S3) are copied to a
+    # temporary file first.
+    try:
+        path = fieldfile.path
+    except NotImplementedError:
+        path = None
+
+    if path is not None:
+        yield path
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(fieldfile.name)[1]) as tmp:
+        with fieldfile.storage.open(fieldfile.name, "rb") as source:
+            shutil.copyfileobj(source, tmp, COPY_CHUNK)
+        tmp.flush()
+        yield tmp.name
+
+
+def media_source(fieldfile):
+    # ffmpeg seeks over HTTP with range requests, so a single frame from a
+    # remote file does not need a full download.
+    try:
+        return fieldfile.path
+    except NotImplementedError:
+        return fieldfile.url
+
+
+def probe(path, kind):
+    from moviepy.editor import AudioFileClip, VideoFileClip
+
+    if kind == "audio":
+        with AudioFileClip(path) as clip:
+            return clip.duration
+
+    with VideoFileClip(path, audio=False) as clip:
+        return clip.duration
+
+
+def extract_poster(source, poster_path, at):
+    from moviepy.config import get_setting
+
+    subprocess.run(
+        [get_setting("FFMPEG_BINARY"), "-v", "error", "-ss", f"{at:.3f}", "-i", source,
+         "-frames:v", "1", "-y", poster_path],
+        check=True, capture_output=True, timeout=POSTER_TIMEOUT,
+    )
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds}s"
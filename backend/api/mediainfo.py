@@ -0,0 +1,422 @@
+import struct
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Reads duration, resolution and codecs from container headers only: MP4/MOV
+# box headers, Matroska/WebM EBML elements and MP3 frame headers. Nothing is
+# decoded, and each parser only touches the few bytes it needs, so a remote
+# file costs a handful of ranged GETs. Anything it does not recognise yields
+# None and the caller falls back to ffmpeg.
+
+MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"mvex"}
+MP4_HANDLERS = {b"vide": "video", b"soun": "audio"}
+MAX_DEPTH = 8
+
+EBML = 0x1A45DFA3
+EBML_DOC_TYPE = 0x4282
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_TYPE = 0x83
+CODEC_ID = 0x86
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CLUSTER = 0x1F43B675
+MATROSKA_TRACK_TYPES = {1: "video", 2: "audio"}
+
+MP3_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Keyed by the two version bits of the frame header: 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5.
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+MP3_SYNC_WINDOW = 4096
+
+
+class FileSource:
+
+    def __init__(self, fileobj, size):
+        self.fileobj = fileobj
+        self.size = size
+
+    def read_at(self, offset, length):
+        if offset >= self.size or length <= 0:
+            return b""
+        self.fileobj.seek(offset)
+        return self.fileobj.read(length)
+
+
+class RangeSource:
+    # A boto3 S3 Object read through ranged GETs. Header walks issue many
+    # tiny reads close to each other, so they are served from a few cached
+    # blocks instead of one request each.
+    block_size = 64 * 1024
+    max_blocks = 16
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.size = obj.content_length
+        self.blocks = OrderedDict()
+        self.requests = 0
+
+    def read_at(self, offset, length):
+        if offset >= self.size or length <= 0:
+            return b""
+        end = min(offset + length, self.size)
+        if end - offset > self.block_size:
+            return self._fetch(offset, end)
+
+        first = offset // self.block_size
+        last = (end - 1) // self.block_size
+        data = b"".join(self._block(index) for index in range(first, last + 1))
+        start = offset - first * self.block_size
+        return data[start:start + end - offset]
+
+    def _block(self, index):
+        block = self.blocks.pop(index, None)
+        if block is None:
+            start = index * self.block_size
+            block = self._fetch(start, min(start + self.block_size, self.size))
+        self.blocks[index] = block
+        while len(self.blocks) > self.max_blocks:
+            self.blocks.popitem(last=False)
+        return block
+
+    def _fetch(self, start, end):
+        self.requests += 1
+        return self.obj.get(Range=f"bytes={start}-{end - 1}")["Body"].read()
+
+
+@contextmanager
+def open_source(fieldfile):
+    storage = fieldfile.storage
+    try:
+        path = storage.path(fieldfile.name)
+    except NotImplementedError:
+        path = None
+
+    if path is not None:
+        with open(path, "rb") as f:
+            yield FileSource(f, storage.size(fieldfile.name))
+    elif hasattr(storage, "bucket"):
+        # S3Boto3StorageFile only downloads on read(); its boto Object is
+        # all we need for ranged GETs.
+        yield RangeSource(storage.open(fieldfile.name, "rb").obj)
+    else:
+        with storage.open(fieldfile.name, "rb") as f:
+            yield FileSource(f, storage.size(fieldfile.name))
+
+
+def read(fieldfile):
+    with open_source(fieldfile) as source:
+        return parse(source)
+
+
+def parse(source):
+    head = source.read_at(0, 12)
+    try:
+        if head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+            return _mp4(source)
+        if head[:4] == EBML.to_bytes(4, "big"):
+            return _matroska(source)
+        if head[:3] == b"ID3" or _mp3_frame(head[:4]):
+            return _mp3(source)
+    except (struct.error, ValueError, IndexError):
+        return None
+    return None
+
+
+def _info(container, duration_ms, tracks):
+    video = next((track for track in tracks if track["type"] == "video"), None)
+    audio = next((track for track in tracks if track["type"] == "audio"), None)
+    return {
+        "format": container,
+        "kind": "video" if video else "audio" if audio else None,
+        "duration_ms": duration_ms,
+        "width": video.get("width") if video else None,
+        "height": video.get("height") if video else None,
+        "video_codec": video.get("codec") if video else None,
+        "audio_codec": audio.get("codec") if audio else None,
+    }
+
+
+def _mp4_boxes(source, start, end):
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack(">I4s", source.read_at(offset, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", source.read_at(offset + 8, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise ValueError("invalid box size")
+        yield kind, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _mp4_walk(source, start, end, depth=0):
+    for kind, box_start, box_end in _mp4_boxes(source, start, end):
+        if kind in MP4_CONTAINERS and depth < MAX_DEPTH:
+            yield from _mp4_walk(source, box_start, box_end, depth + 1)
+        else:
+            yield kind, box_start, box_end
+
+
+def _mp4(source):
+    moov = next(((start, end) for kind, start, end in _mp4_boxes(source, 0, source.size) if kind == b"moov"), None)
+    if moov is None:
+        return None
+
+    timescale = duration = None
+    tracks = []
+    track = None
+    for kind, start, end in _mp4_walk(source, *moov):
+        data = source.read_at(start, min(end - start, 128))
+        if kind == b"mvhd":
+            if data[0] == 1:
+                timescale, duration = struct.unpack(">IQ", data[20:32])
+            else:
+                timescale, duration = struct.unpack(">II", data[12:20])
+        elif kind == b"mehd" and not duration:
+            # Fragmented files keep the total in the movie extends header.
+            if data[0] == 1:
+                duration = struct.unpack(">Q", data[4:12])[0]
+            else:
+                duration = struct.unpack(">I", data[4:8])[0]
+        elif kind == b"tkhd":
+            track = {"type": None}
+            tracks.append(track)
+            base = 88 if data[0] == 1 else 76
+            width, height = struct.unpack(">II", data[base:base + 8])
+            track["width"], track["height"] = width >> 16, height >> 16
+        elif kind == b"hdlr" and track is not None:
+            # QuickTime also puts a data handler ("alis", "url ") under minf.
+            track["type"] = track["type"] or MP4_HANDLERS.get(data[8:12])
+        elif kind == b"stsd" and track is not None:
+            track["codec"] = data[12:16].decode("latin-1").strip()
+
+    if not timescale or not duration or duration in (0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+        duration_ms = None
+    else:
+        duration_ms = duration * 1000 // timescale
+    return _info("mp4", duration_ms, [track for track in tracks if track["type"]])
+
+
+def _ebml_vint(source, offset, keep_marker):
+    first = source.read_at(offset, 1)[0]
+    if first == 0:
+        raise ValueError("invalid EBML variable-length integer")
+    length = 9 - first.bit_length()
+    value = int.from_bytes(source.read_at(offset, length), "big")
+    if keep_marker:
+        return value, length
+    mask = (1 << (7 * length)) - 1
+    value &= mask
+    return (None if value == mask else value), length
+
+
+def _ebml_elements(source, start, end):
+    offset = start
+    while offset < end:
+        element_id, id_length = _ebml_vint(source, offset, True)
+        size, size_length = _ebml_vint(source, offset + id_length, False)
+        data_start = offset + id_length + size_length
+        # An unknown size (live WebM segments) runs to the end of the parent.
+        data_end = end if size is None else min(data_start + size, end)
+        yield element_id, data_start, data_end
+        if size is None:
+            return
+        offset = data_end
+
+
+def _ebml_uint(source, start, end):
+    return int.from_bytes(source.read_at(start, end - start), "big")
+
+
+def _ebml_float(source, start, end):
+    data = source.read_at(start, end - start)
+    if len(data) == 4:
+        return struct.unpack(">f", data)[0]
+    if len(data) == 8:
+        return struct.unpack(">d", data)[0]
+    return None
+
+
+def _ebml_string(source, start, end):
+    return source.read_at(start, end - start).rstrip(b"\x00").decode("latin-1")
+
+
+def _matroska(source):
+    container = "matroska"
+    segment = None
+    for element_id, start, end in _ebml_elements(source, 0, source.size):
+        if element_id == EBML:
+            for child_id, child_start, child_end in _ebml_elements(source, start, end):
+                if child_id == EBML_DOC_TYPE:
+                    container = _ebml_string(source, child_start, child_end)
+        elif element_id == SEGMENT:
+            segment = (start, end)
+            break
+    if segment is None:
+        return None
+
+    sections = {}
+    seeks = {}
+    for element_id, start, end in _ebml_elements(source, *segment):
+        if element_id in (INFO, TRACKS):
+            sections[element_id] = (start, end)
+        elif element_id == SEEK_HEAD:
+            seeks.update(_matroska_seeks(source, start, end))
+        if element_id == CLUSTER or (INFO in sections and TRACKS in sections):
+            break
+
+    # Muxers that write headers last leave only a SeekHead pointer up front.
+    for wanted in (INFO, TRACKS):
+        if wanted not in sections and wanted in seeks:
+            element_id, start, end = next(_ebml_elements(source, segment[0] + seeks[wanted], segment[1]))
+            if element_id == wanted:
+                sections[wanted] = (start, end)
+    if INFO not in sections:
+        return None
+
+    scale = 1000000
+    duration = None
+    for element_id, start, end in _ebml_elements(source, *sections[INFO]):
+        if element_id == TIMECODE_SCALE:
+            scale = _ebml_uint(source, start, end)
+        elif element_id == DURATION:
+            duration = _ebml_float(source, start, end)
+
+    tracks = []
+    if TRACKS in sections:
+        for element_id, start, end in _ebml_elements(source, *sections[TRACKS]):
+            if element_id == TRACK_ENTRY:
+                tracks.append(_matroska_track(source, start, end))
+
+    duration_ms = round(duration * scale / 1000000) if duration else None
+    return _info(container, duration_ms, [track for track in tracks if track["type"]])
+
+
+def _matroska_seeks(source, start, end):
+    seeks = {}
+    for element_id, seek_start, seek_end in _ebml_elements(source, start, end):
+        if element_id != SEEK:
+            continue
+        target = position = None
+        for child_id, child_start, child_end in _ebml_elements(source, seek_start, seek_end):
+            if child_id == SEEK_ID:
+                target = _ebml_uint(source, child_start, child_end)
+            elif child_id == SEEK_POSITION:
+                position = _ebml_uint(source, child_start, child_end)
+        if target is not None and position is not None:
+            seeks.setdefault(target, position)
+    return seeks
+
+
+def _matroska_track(source, start, end):
+    track = {"type": None}
+    for element_id, child_start, child_end in _ebml_elements(source, start, end):
+        if element_id == TRACK_TYPE:
+            track["type"] = MATROSKA_TRACK_TYPES.get(_ebml_uint(source, child_start, child_end))
+        elif element_id == CODEC_ID:
+            track["codec"] = _ebml_string(source, child_start, child_end)
+        elif element_id == VIDEO:
+            for video_id, video_start, video_end in _ebml_elements(source, child_start, child_end):
+                if video_id == PIXEL_WIDTH:
+                    track["width"] = _ebml_uint(source, video_start, video_end)
+                elif video_id == PIXEL_HEIGHT:
+                    track["height"] = _ebml_uint(source, video_start, video_end)
+    return track
+
+
+def _mp3_frame(header):
+    if len(header) < 4:
+        return None
+    word = int.from_bytes(header[:4], "big")
+    if word >> 21 != 0x7FF:
+        return None
+    version = (word >> 19) & 3
+    layer = 4 - ((word >> 17) & 3)
+    bitrate_index = (word >> 12) & 15
+    rate_index = (word >> 10) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    padding = (word >> 9) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or mpeg1 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return {
+        "mpeg1": mpeg1,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "samples": samples,
+        "length": length,
+        "mono": (word >> 6) & 3 == 3,
+    }
+
+
+def _mp3(source):
+    offset = 0
+    tag = source.read_at(0, 10)
+    if tag[:3] == b"ID3":
+        size = (tag[6] & 0x7F) << 21 | (tag[7] & 0x7F) << 14 | (tag[8] & 0x7F) << 7 | (tag[9] & 0x7F)
+        offset = 10 + size + (10 if tag[5] & 0x10 else 0)
+
+    # Accept a sync word only when another frame header follows it.
+    window = source.read_at(offset, MP3_SYNC_WINDOW)
+    frame = None
+    for index in range(len(window) - 3):
+        if window[index] != 0xFF:
+            continue
+        candidate = _mp3_frame(window[index:index + 4])
+        if candidate and _mp3_frame(source.read_at(offset + index + candidate["length"], 4)):
+            frame = candidate
+            offset += index
+            break
+    if frame is None:
+        return None
+
+    if frame["mpeg1"]:
+        side_info = 17 if frame["mono"] else 32
+    else:
+        side_info = 9 if frame["mono"] else 17
+    header = source.read_at(offset, 64)
+    xing = 4 + side_info
+    frames = None
+    if header[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", header[xing + 4:xing + 8])[0]
+        if flags & 1:
+            frames = struct.unpack(">I", header[xing + 8:xing + 12])[0]
+    elif header[36:40] == b"VBRI":
+        frames = struct.unpack(">I", header[50:54])[0]
+
+    if frames:
+        duration_ms = frames * frame["samples"] * 1000 // frame["sample_rate"]
+    else:
+        end = source.size
+        if source.read_at(end - 128, 3) == b"TAG":
+            end -= 128
+        duration_ms = (end - offset) * 8 * 1000 // frame["bitrate"]
+    return _info("mp3", duration_ms, [{"type": "audio", "codec": f"mp{frame['layer']}"}])
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='course-file'),
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='title',
+            field=models.CharField(max_length=1000),
+        ),
+        migrations.AlterField(
+            model_name='teacher',
+            name='image',
+            field=models.ImageField(blank=True, default='default.jpg', null=True, upload_to='course-file'),
+        ),
+        migrations.AddIndex(
+            model_name='cartorderitem',
+            index=models.Index(fields=['teacher', '-date'], name='api_cartord_teacher_d7bf3f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['platform_status', 'teacher_course_status', '-date'], name='api_course_platfor_073400_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrolledcourse',
+            index=models.Index(fields=['user', '-date'], name='api_enrolle_user_id_f5bd40_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['teacher', 'seen', '-date'], name='api_notific_teacher_0965f7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['course', '-date'], name='api_review_course__a4f29a_idx'),
+        ),
+    ]
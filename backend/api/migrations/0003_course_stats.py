@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_course_stats(apps, schema_editor):
+    # Same values as CourseStats.compute(); historical models do not carry
+    # its classmethods, so the aggregates are repeated here.
+    Course = apps.get_model("api", "Course")
+    CourseStats = apps.get_model("api", "CourseStats")
+    Review = apps.get_model("api", "Review")
+    EnrolledCourse = apps.get_model("api", "EnrolledCourse")
+    VariantItem = apps.get_model("api", "VariantItem")
+
+    stats = {course_id: CourseStats(course_id=course_id) for course_id in Course.objects.values_list("id", flat=True)}
+    ratings = Review.objects.filter(active=True).values("course", "rating").annotate(count=models.Count("id"))
+    for row in ratings:
+        row_stats = stats[row["course"]]
+        setattr(row_stats, f"rating_{row['rating']}", row["count"])
+        row_stats.rating_count += row["count"]
+        row_stats.rating_sum += row["rating"] * row["count"]
+
+    for row in EnrolledCourse.objects.values("course").annotate(count=models.Count("id")):
+        stats[row["course"]].student_count = row["count"]
+    for row in VariantItem.objects.values("variant__course").annotate(count=models.Count("id")):
+        stats[row["variant__course"]].lecture_count = row["count"]
+
+    for row_stats in stats.values():
+        if row_stats.rating_count:
+            row_stats.average_rating = row_stats.rating_sum / row_stats.rating_count
+    CourseStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_list_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('average_rating', models.FloatField(blank=True, null=True)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+                ('student_count', models.PositiveIntegerField(default=0)),
+                ('lecture_count', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='api.course')),
+            ],
+            options={
+                'verbose_name_plural': 'Course Stats',
+            },
+        ),
+        migrations.RunPython(backfill_course_stats, migrations.RunPython.noop),
+    ]
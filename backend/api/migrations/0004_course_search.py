@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+def fill_search_documents(apps, schema_editor):
+    Course = apps.get_model("api", "Course")
+    courses = list(Course.objects.select_related("category", "teacher"))
+    for course in courses:
+        parts = [
+            course.title,
+            course.description,
+            course.category.title if course.category else None,
+            course.teacher.full_name if course.teacher else None,
+        ]
+        course.search_document = "\n".join(part for part in parts if part)
+    Course.objects.bulk_update(courses, ["search_document"], batch_size=500)
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS api_course_search_gin ON api_course "
+            "USING gin (to_tsvector('english'::regconfig, COALESCE(search_document, '')))"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS api_course_title_trgm ON api_course USING gin (title gin_trgm_ops)"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS api_course_fts USING fts5(search_document, tokenize='porter unicode61')")
+        schema_editor.execute("INSERT INTO api_course_fts (rowid, search_document) SELECT id, search_document FROM api_course")
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS api_course_search_gin")
+        schema_editor.execute("DROP INDEX IF EXISTS api_course_title_trgm")
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS api_course_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_course_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
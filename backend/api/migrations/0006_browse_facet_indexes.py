@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_updated_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['platform_status', 'teacher_course_status', 'category'], name='api_course_platfor_ae5f7c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['platform_status', 'teacher_course_status', 'language', 'level'], name='api_course_platfor_707f44_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['platform_status', 'teacher_course_status', 'price'], name='api_course_platfor_72ca2f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursestats',
+            index=models.Index(fields=['average_rating'], name='api_courses_average_49b5fe_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_browse_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurriculumSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('stale', models.BooleanField(default=True)),
+                ('data', models.JSONField(default=dict)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='curriculum_snapshot', to='api.course')),
+            ],
+        ),
+    ]
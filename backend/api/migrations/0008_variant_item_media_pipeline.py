@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # Files uploaded before the pipeline were probed inline on save.
+    VariantItem = apps.get_model("api", "VariantItem")
+    VariantItem.objects.exclude(file="").exclude(file__isnull=True).update(media_status="Ready")
+    apps.get_model("api", "CurriculumSnapshot").objects.update(stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_curriculum_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variantitem',
+            name='media_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='media_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='media_next_attempt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='media_status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Ready', 'Ready'), ('Failed', 'Failed')], max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='poster',
+            field=models.ImageField(blank=True, null=True, upload_to='course-file'),
+        ),
+        migrations.AddIndex(
+            model_name='variantitem',
+            index=models.Index(fields=['media_status', 'media_next_attempt'], name='api_variant_media_s_20e803_idx'),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_variant_item_media_pipeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variantitem',
+            name='hls_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='hls_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='hls_manifest',
+            field=models.FileField(blank=True, max_length=500, null=True, upload_to='course-hls'),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='hls_next_attempt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='hls_status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Ready', 'Ready'), ('Failed', 'Failed')], max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='variantitem',
+            index=models.Index(fields=['hls_status', 'hls_next_attempt'], name='api_variant_hls_sta_d22b1b_idx'),
+        ),
+    ]
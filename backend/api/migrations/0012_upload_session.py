@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import shortuuid.django_fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_stored_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', shortuuid.django_fields.ShortUUIDField(alphabet='abcdefghijklmnopqrstuvwxyz1234567890', length=16, max_length=30, prefix='', unique=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('temp_name', models.CharField(max_length=500)),
+                ('storage_upload_id', models.CharField(blank=True, max_length=1000, null=True)),
+                ('status', models.CharField(choices=[('Active', 'Active'), ('Complete', 'Complete'), ('Aborted', 'Aborted')], default='Active', max_length=100)),
+                ('file', models.CharField(blank=True, max_length=500, null=True)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires', models.DateTimeField()),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.teacher')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('etag', models.CharField(blank=True, max_length=200, null=True)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='api.uploadsession')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='uploadchunk',
+            constraint=models.UniqueConstraint(fields=('session', 'index'), name='unique_upload_chunk'),
+        ),
+    ]
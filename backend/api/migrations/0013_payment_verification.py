@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentVerification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paypal_order_id', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Paid', 'Paid'), ('Rejected', 'Rejected'), ('Failed', 'Failed')], default='Pending', max_length=100)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('next_attempt', models.DateTimeField(blank=True, null=True)),
+                ('completed', models.DateTimeField(blank=True, null=True)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payment_verification', to='api.cartorder')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt'], name='api_payment_status_b0c8d1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:52
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_codes(apps, schema_editor):
+    # The oldest coupon keeps a duplicated code; later ones get their id
+    # appended so the unique constraint can be added.
+    Coupon = apps.get_model("api", "Coupon")
+    seen = set()
+    for coupon in Coupon.objects.order_by("id").only("id", "code").iterator():
+        if coupon.code in seen:
+            suffix = f"-{coupon.id}"
+            coupon.code = coupon.code[:50 - len(suffix)] + suffix
+            coupon.save(update_fields=["code"])
+        seen.add(coupon.code)
+
+
+def count_past_uses(apps, schema_editor):
+    Coupon = apps.get_model("api", "Coupon")
+    for coupon in Coupon.objects.annotate(uses=Count("cartorder")).filter(uses__gt=0).iterator():
+        Coupon.objects.filter(pk=coupon.pk).update(used_count=coupon.uses)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='max_uses',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='used_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='valid_from',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='valid_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(dedupe_codes, migrations.RunPython.noop),
+        migrations.RunPython(count_past_uses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='coupon',
+            name='code',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_coupon_engine'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='completedlesson',
+            index=models.Index(fields=['user', 'course'], name='api_complet_user_id_c6d8c2_idx'),
+        ),
+    ]
@@ -1,13 +1,11 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from userauths.models import User,Profile
 
 from django.utils import timezone
 
 from django.utils.text import slugify
 from shortuuid.django_fields import ShortUUIDField
-from moviepy.editor import VideoFileClip
-
-import math
 
 LANGUAGE = (
     ("English", "English"),
@@ -49,6 +47,27 @@ RATING = (
     (5, "5 Star"),
 )
 
+MEDIA_STATUS = (
+    ("Pending", "Pending"),
+    ("Processing", "Processing"),
+    ("Ready", "Ready"),
+    ("Failed", "Failed"),
+)
+
+UPLOAD_STATUS = (
+    ("Active", "Active"),
+    ("Complete", "Complete"),
+    ("Aborted", "Aborted"),
+)
+
+VERIFICATION_STATUS = (
+    ("Pending", "Pending"),
+    ("Processing", "Processing"),
+    ("Paid", "Paid"),
+    ("Rejected", "Rejected"),
+    ("Failed", "Failed"),
+)
+
 NOTI_TYPE = (
     ("New Order", "New Order"),
     ("New Review", "New Review"),
@@ -86,6 +105,7 @@ class Category(models.Model):
     image = models.FileField(upload_to="course-file", default="category.jpg",  blank=True, null= True)
     active = models.BooleanField(default = True)
     slug = models.SlugField(unique= True, blank=True, null= True)
+    updated = models.DateTimeField(auto_now = True)
 
     class Meta:
         verbose_name_plural = "Category"
@@ -102,6 +122,27 @@ class Category(models.Model):
             self.slug = slugify(self.title)
         super(Category, self).save(*args,**kwargs)
 
+class CourseQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(platform_status = "Published", teacher_course_status = "Published")
+
+    def catalog(self):
+        return self.select_related("category", "teacher", "stats")
+
+    def touch(self):
+        return self.update(updated = timezone.now())
+
+    def refresh_search_documents(self):
+        courses = list(self.select_related("category", "teacher"))
+        changed = []
+        for course in courses:
+            document = course.build_search_document()
+            if document != course.search_document:
+                course.search_document = document
+                changed.append(course)
+        Course.objects.bulk_update(changed, ["search_document"])
+        return changed
+
 class Course(models.Model):
     category = models.ForeignKey(Category, on_delete = models.SET_NULL, blank=True, null= True )
     teacher = models.ForeignKey(Teacher, on_delete = models.SET_NULL, blank=True, null= True)
@@ -118,6 +159,18 @@ class Course(models.Model):
     course_id = ShortUUIDField(unique = True, length = 6, max_length = 20, alphabet = "1234567890")
     slug = models.SlugField(unique= True, blank=True, null= True)
     date = models.DateTimeField(default = timezone.now)
+    updated = models.DateTimeField(auto_now = True)
+    search_document = models.TextField(blank=True, default = "", editable = False)
+
+    objects = CourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ["platform_status", "teacher_course_status", "-date"]),
+            models.Index(fields = ["platform_status", "teacher_course_status", "category"]),
+            models.Index(fields = ["platform_status", "teacher_course_status", "language", "level"]),
+            models.Index(fields = ["platform_status", "teacher_course_status", "price"]),
+        ]
 
     def __str__(self):
         return self.title  
@@ -125,8 +178,18 @@ class Course(models.Model):
     def save(self, *args, **kwargs):
         if self.slug == "" or self.slug == None:
             self.slug = slugify(self.title)
+        self.search_document = self.build_search_document()
         super(Course, self).save(*args,**kwargs)
 
+    def build_search_document(self):
+        parts = [
+            self.title,
+            self.description,
+            self.category.title if self.category else None,
+            self.teacher.full_name if self.teacher else None,
+        ]
+        return "\n".join(part for part in parts if part)
+
     def students(self):
         return EnrolledCourse.objects.filter(course=self)
     
@@ -137,15 +200,99 @@ class Course(models.Model):
         return VariantItem.objects.filter(variant__course = self)
 
     def average_rating(self):
-        average_rating = Review.objects.filter(course = self).aggregate(avg_rating = models.Avg('rating'))
-        return average_rating['avg_rating']
+        try:
+            return self.stats.average_rating
+        except CourseStats.DoesNotExist:
+            average_rating = Review.objects.filter(course = self, active = True).aggregate(avg_rating = models.Avg('rating'))
+            return average_rating['avg_rating']
     
     def rating_count(self):
-        return Review.objects.filter(course = self, active=True).count()
+        try:
+            return self.stats.rating_count
+        except CourseStats.DoesNotExist:
+            return Review.objects.filter(course = self, active=True).count()
     
     def reviews(self):
         return Review.objects.filter(course = self, active = True)
     
+class CourseStats(models.Model):
+    course = models.OneToOneField(Course, on_delete = models.CASCADE, related_name = "stats")
+    average_rating = models.FloatField(blank=True, null= True)
+    rating_count = models.PositiveIntegerField(default = 0)
+    rating_sum = models.PositiveIntegerField(default = 0)
+    rating_1 = models.PositiveIntegerField(default = 0)
+    rating_2 = models.PositiveIntegerField(default = 0)
+    rating_3 = models.PositiveIntegerField(default = 0)
+    rating_4 = models.PositiveIntegerField(default = 0)
+    rating_5 = models.PositiveIntegerField(default = 0)
+    student_count = models.PositiveIntegerField(default = 0)
+    lecture_count = models.PositiveIntegerField(default = 0)
+    updated = models.DateTimeField(auto_now = True)
+
+    class Meta:
+        verbose_name_plural = "Course Stats"
+        indexes = [
+            models.Index(fields = ["average_rating"]),
+        ]
+
+    def __str__(self):
+        return self.course.title
+
+    def histogram(self):
+        return {rating: getattr(self, f"rating_{rating}") for rating, _ in RATING}
+
+    @classmethod
+    def compute(cls, course_ids):
+        # Fresh values straight from the source tables, keyed by course id.
+        stats = {course_id: {"average_rating": None, "rating_count": 0, "rating_sum": 0, "rating_1": 0, "rating_2": 0, "rating_3": 0, "rating_4": 0, "rating_5": 0, "student_count": 0, "lecture_count": 0} for course_id in course_ids}
+
+        ratings = (Review.objects.filter(course__in = course_ids, active = True)
+                   .values("course", "rating").annotate(count = models.Count("id")))
+        for row in ratings:
+            values = stats[row["course"]]
+            values[f"rating_{row['rating']}"] = row["count"]
+            values["rating_count"] += row["count"]
+            values["rating_sum"] += row["rating"] * row["count"]
+
+        students = EnrolledCourse.objects.filter(course__in = course_ids).values("course").annotate(count = models.Count("id"))
+        for row in students:
+            stats[row["course"]]["student_count"] = row["count"]
+
+        lectures = VariantItem.objects.filter(variant__course__in = course_ids).values("variant__course").annotate(count = models.Count("id"))
+        for row in lectures:
+            stats[row["variant__course"]]["lecture_count"] = row["count"]
+
+        for values in stats.values():
+            if values["rating_count"]:
+                values["average_rating"] = values["rating_sum"] / values["rating_count"]
+        return stats
+
+    @classmethod
+    def add_rating(cls, course_id, rating, sign = 1):
+        rating = int(rating)
+        # Every F() below reads the pre-update row, so the average is derived
+        # from the new sum and count inside the same UPDATE statement.
+        new_count = models.F("rating_count") + sign
+        new_sum = models.F("rating_sum") + sign * rating
+        cls.objects.filter(course_id = course_id).update(
+            rating_count = new_count,
+            rating_sum = new_sum,
+            average_rating = models.Case(
+                models.When(rating_count = -sign, then = models.Value(None)),
+                default = models.ExpressionWrapper(new_sum * 1.0 / new_count, output_field = models.FloatField()),
+            ),
+            updated = timezone.now(),
+            **{f"rating_{rating}": models.F(f"rating_{rating}") + sign},
+        )
+
+    @classmethod
+    def add_students(cls, course_id, count = 1):
+        cls.objects.filter(course_id = course_id).update(student_count = models.F("student_count") + count, updated = timezone.now())
+
+    @classmethod
+    def add_lectures(cls, variant_id, count = 1):
+        cls.objects.filter(course__variant = variant_id).update(lecture_count = models.F("lecture_count") + count, updated = timezone.now())
+
 class Variant(models.Model):
     course = models.ForeignKey(Course, on_delete = models.CASCADE)
     title = models.CharField(max_length = 1000)
@@ -171,24 +318,56 @@ class VariantItem(models.Model):
     preview = models.BooleanField(default = False)
     variant_item_id = ShortUUIDField(unique = True, length = 6, max_length = 20, alphabet = "1234567890")
     date = models.DateTimeField(default = timezone.now)
+    poster = models.ImageField(upload_to="course-file", null=True, blank=True)
+    media_status = models.CharField(choices = MEDIA_STATUS, max_length = 100, blank=True, null= True)
+    media_attempts = models.PositiveIntegerField(default = 0)
+    media_error = models.TextField(blank=True, null= True)
+    media_next_attempt = models.DateTimeField(blank=True, null= True)
+    hls_manifest = models.FileField(upload_to="course-hls", max_length = 500, null=True, blank=True)
+    hls_status = models.CharField(choices = MEDIA_STATUS, max_length = 100, blank=True, null= True)
+    hls_attempts = models.PositiveIntegerField(default = 0)
+    hls_error = models.TextField(blank=True, null= True)
+    hls_next_attempt = models.DateTimeField(blank=True, null= True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ["media_status", "media_next_attempt"]),
+            models.Index(fields = ["hls_status", "hls_next_attempt"]),
+        ]
 
     def __str__(self):
         return f"{self.variant.title} - {self.title}"
     
     def save(self, *args, **kwargs):
+        # Probing happens in the media pipeline (manage.py process_media);
+        # a fresh upload is only queued here so the request returns at once.
+        if self.file and not self.file._committed:
+            self.queue_media()
+        elif not self.file:
+            self.media_status = None
+            self.hls_status = None
+            self.hls_manifest = None
         super().save(*args, **kwargs)
 
-        if self.file:
-            clip = VideoFileClip(self.file.path)
-            duration_seconds = clip.duration
-
-            minutes, remainder =divmod(duration_seconds, 60)
-            minutes = math.floor(minutes)
-            seconds = math.floor(remainder)
+    def queue_media(self):
+        # The old HLS package no longer matches the file; clearing it here
+        # lets the VariantItem signals delete it once the save commits.
+        self.media_status = "Pending"
+        self.media_attempts = 0
+        self.media_error = None
+        self.media_next_attempt = None
+        self.hls_status = None
+        self.hls_manifest = None
+
+class CurriculumSnapshot(models.Model):
+    course = models.OneToOneField(Course, on_delete = models.CASCADE, related_name = "curriculum_snapshot")
+    version = models.PositiveIntegerField(default = 0)
+    stale = models.BooleanField(default = True)
+    data = models.JSONField(default = dict)
+    updated = models.DateTimeField(auto_now = True)
 
-            duration_text = f"{minutes}m {seconds}s"
-            self.content_duration = duration_text
-            super().save(update_fields = ["content_duration"])
+    def __str__(self):
+        return f"{self.course.title} - v{self.version}"
 
 class Question_Answer(models.Model):
     course = models.ForeignKey(Course,  on_delete = models.CASCADE)
@@ -282,6 +461,9 @@ class CartOrderItem(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields = ["teacher", "-date"]),
+        ]
 
     def order_id(self):
         return f"Order ID #{self.order.oid}"
@@ -292,6 +474,39 @@ class CartOrderItem(models.Model):
     def __str__(self):
         return self.oid
     
+class PaymentVerification(models.Model):
+    order = models.OneToOneField(CartOrder, on_delete = models.CASCADE, related_name = "payment_verification")
+    paypal_order_id = models.CharField(max_length = 100)
+    status = models.CharField(choices = VERIFICATION_STATUS, default = "Pending", max_length = 100)
+    attempts = models.PositiveIntegerField(default = 0)
+    error = models.TextField(blank=True, null= True)
+    next_attempt = models.DateTimeField(blank=True, null= True)
+    completed = models.DateTimeField(blank=True, null= True)
+    date = models.DateTimeField(default = timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ["status", "next_attempt"]),
+        ]
+
+    def __str__(self):
+        return f"{self.order.oid} - {self.status}"
+
+class IdempotencyRecord(models.Model):
+    # key is a digest of the Idempotency-Key header, the endpoint and the
+    # caller, so one unique index covers the lookup.
+    key = models.CharField(max_length = 64, unique = True)
+    request_hash = models.CharField(max_length = 64)
+    status_code = models.PositiveSmallIntegerField(blank=True, null= True)
+    body = models.TextField(blank=True, null= True)
+    date = models.DateTimeField(default = timezone.now)
+    expires = models.DateTimeField(db_index = True)
+    # Lease of the request running under this key; cleared with its result.
+    locked_until = models.DateTimeField(blank=True, null= True)
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'running'})"
+
 class Certificate(models.Model):
     course = models.ForeignKey(Course, on_delete = models.CASCADE)
     user = models.ForeignKey(User,  on_delete = models.SET_NULL, blank=True, null= True)
@@ -307,9 +522,26 @@ class CompletedLesson(models.Model):
     variant_item = models.ForeignKey(VariantItem, on_delete = models.CASCADE)
     date = models.DateTimeField(default = timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields = ["user", "course"]),
+        ]
+
     def __str__(self):
         return self.course.title
     
+class EnrolledCourseQuerySet(models.QuerySet):
+    def learning_summary(self):
+        # Per-enrollment progress for "My Learning" as correlated subqueries,
+        # so the whole page is one query however many courses it lists.
+        completed = CompletedLesson.objects.filter(course = models.OuterRef("course_id"), user = models.OuterRef("user_id"))
+        completed_count = completed.order_by().values("user").annotate(total = models.Count("variant_item", distinct = True)).values("total")
+        last_completed = completed.order_by("-date").values("date")[:1]
+        return self.select_related("course__category", "course__teacher", "course__stats").annotate(
+            completed_lessons = Coalesce(models.Subquery(completed_count), 0),
+            last_activity = Coalesce(models.Subquery(last_completed), "date"),
+        )
+
 class EnrolledCourse(models.Model):
     course = models.ForeignKey(Course, on_delete = models.CASCADE)
     user = models.ForeignKey(User,  on_delete = models.SET_NULL, blank=True, null= True)
@@ -317,6 +549,13 @@ class EnrolledCourse(models.Model):
     order_item = models.ForeignKey(CartOrderItem, on_delete = models.CASCADE)
     enrollment_id = ShortUUIDField(unique = True, length = 6, max_length = 20, alphabet = "1234567890")
     date = models.DateTimeField(default = timezone.now)
+
+    objects = EnrolledCourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ["user", "-date"]),
+        ]
     
     def __str__(self):
             return self.course.title
@@ -359,6 +598,11 @@ class Review(models.Model):
     active = models.BooleanField(default = False)
     date = models.DateTimeField(default = timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields = ["course", "-date"]),
+        ]
+
     def __str__(self):
         return self.course.title
     
@@ -375,15 +619,24 @@ class Notification(models.Model):
     seen = models.BooleanField(default = False)
     date = models.DateTimeField(default = timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields = ["teacher", "seen", "-date"]),
+        ]
+
     def __str__(self):
         return self.type
 
 class Coupon(models.Model):
     teacher = models.ForeignKey(Teacher,  on_delete = models.SET_NULL, blank=True, null= True)
     used_by = models.ManyToManyField(User, blank = True)
-    code = models.CharField(max_length = 50)
+    code = models.CharField(max_length = 50, unique = True)
     discount = models.IntegerField(default = 1)
     active = models.BooleanField(default = False)
+    valid_from = models.DateTimeField(blank=True, null= True)
+    valid_until = models.DateTimeField(blank=True, null= True)
+    max_uses = models.PositiveIntegerField(blank=True, null= True)
+    used_count = models.PositiveIntegerField(default = 0)
     date = models.DateTimeField(default = timezone.now)
 
     def __str__(self):
@@ -404,3 +657,71 @@ class Country(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class ImageDerivative(models.Model):
+    source = models.CharField(max_length = 500)
+    width = models.PositiveIntegerField()
+    format = models.CharField(max_length = 10)
+    file = models.FileField(upload_to = "image-derivatives", max_length = 500)
+    size = models.PositiveIntegerField(default = 0)
+    last_used = models.DateTimeField(default = timezone.now, db_index = True)
+    date = models.DateTimeField(default = timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields = ["source", "width", "format"], name = "unique_image_derivative"),
+        ]
+
+    def __str__(self):
+        return f"{self.source} @ {self.width}w {self.format}"
+
+
+class StoredBlob(models.Model):
+    digest = models.CharField(max_length = 64, unique = True)
+    name = models.CharField(max_length = 500, unique = True)
+    size = models.BigIntegerField(default = 0)
+    refcount = models.PositiveIntegerField(default = 0)
+    date = models.DateTimeField(default = timezone.now)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class UploadSession(models.Model):
+    teacher = models.ForeignKey(Teacher, on_delete = models.CASCADE)
+    upload_id = ShortUUIDField(unique = True, length = 16, max_length = 30, alphabet = "abcdefghijklmnopqrstuvwxyz1234567890")
+    filename = models.CharField(max_length = 255)
+    size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    temp_name = models.CharField(max_length = 500)
+    storage_upload_id = models.CharField(max_length = 1000, blank=True, null= True)
+    status = models.CharField(choices = UPLOAD_STATUS, default = "Active", max_length = 100)
+    file = models.CharField(max_length = 500, blank=True, null= True)
+    date = models.DateTimeField(default = timezone.now)
+    expires = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.filename} ({self.upload_id})"
+
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete = models.CASCADE, related_name = "chunks")
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length = 64)
+    etag = models.CharField(max_length = 200, blank=True, null= True)
+    date = models.DateTimeField(default = timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields = ["session", "index"], name = "unique_upload_chunk"),
+        ]
+
+    def __str__(self):
+        return f"{self.session.upload_id} #{self.index}"
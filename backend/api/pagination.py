@@ -0,0 +1,28 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class DateCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return ordering
+        return super().get_ordering(request, queryset, view)
+
+
+class SearchResultsPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CartPagination(PageNumberPagination):
+    # Carts mix Cart rows with lines from the cart store, so pages are cut
+    # from the merged list instead of a queryset cursor.
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
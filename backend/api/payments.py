@@ -0,0 +1,134 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from api import paypal
+from api import models as api_models
+from api.cache import course_detail_cache, course_tag
+
+MAX_ATTEMPTS = getattr(settings, "PAYMENT_VERIFY_MAX_ATTEMPTS", 8)
+RETRY_DELAY = getattr(settings, "PAYMENT_VERIFY_RETRY_DELAY", 5)
+LEASE_SECONDS = getattr(settings, "PAYMENT_VERIFY_LEASE_SECONDS", 2 * 60)
+
+
+def request_verification(order, paypal_order_id):
+    # One job per order, so a double-submitted confirmation finds the job
+    # already queued. A rejected or failed job is queued again.
+    verification, created = api_models.PaymentVerification.objects.get_or_create(
+        order=order, defaults={"paypal_order_id": paypal_order_id},
+    )
+    if not created and verification.status in ("Rejected", "Failed"):
+        api_models.PaymentVerification.objects.filter(pk=verification.pk, status=verification.status).update(
+            paypal_order_id=paypal_order_id, status="Pending", attempts=0, error=None, next_attempt=None,
+        )
+        verification.refresh_from_db()
+    return verification, created
+
+
+def claim(limit, lease=LEASE_SECONDS):
+    # Same leasing as the media pipeline: due Pending jobs plus Processing
+    # jobs whose worker died before finishing.
+    now = timezone.now()
+    due = Q(next_attempt__isnull=True) | Q(next_attempt__lte=now)
+    ready = Q(status="Pending") & due | Q(status="Processing", next_attempt__lte=now)
+    with transaction.atomic():
+        ids = list(api_models.PaymentVerification.objects.select_for_update(skip_locked=True)
+                   .filter(ready).order_by("next_attempt", "id")
+                   .values_list("id", flat=True)[:limit])
+        api_models.PaymentVerification.objects.filter(id__in=ids).update(
+            status="Processing", attempts=F("attempts") + 1, next_attempt=now + timedelta(seconds=lease),
+        )
+    return ids
+
+
+def process(verification_id):
+    verification = (api_models.PaymentVerification.objects.select_related("order")
+                    .filter(id=verification_id, status="Processing").first())
+    if verification is None:
+        return None
+
+    try:
+        paypal_order = paypal.client().get_order(verification.paypal_order_id)
+    except paypal.PayPalError as e:
+        status_code = getattr(e, "status_code", None)
+        if status_code and status_code < 500 and status_code != 429:
+            return finish(verification, "Rejected", e)
+        return fail(verification, e)
+
+    if paypal_order.get("status") != "COMPLETED":
+        # Not captured yet; PayPal may still complete it, so check again.
+        return fail(verification, f"PayPal order status is {paypal_order.get('status')}")
+
+    # As in the media pipeline, any error fails the job for a retry rather
+    # than escaping into the worker pool.
+    try:
+        fulfilled = fulfill(verification.order)
+    except Exception as e:
+        return fail(verification, e)
+    if not fulfilled:
+        # Either an earlier run of this job fulfilled the order and its worker
+        # died before finishing, or the order left Processing some other way
+        # and must not be recorded as paid.
+        order = verification.order
+        order.refresh_from_db(fields=["payment_status"])
+        if order.payment_status != "Paid":
+            return finish(verification, "Rejected", f"Order payment status is {order.payment_status}")
+    return finish(verification, "Paid")
+
+
+def finish(verification, status, error=None):
+    verification.status = status
+    verification.error = f"{type(error).__name__}: {error}" if isinstance(error, Exception) else error
+    verification.next_attempt = None
+    verification.completed = timezone.now()
+    verification.save(update_fields=["status", "error", "next_attempt", "completed"])
+    return status
+
+
+def fail(verification, error):
+    verification.error = f"{type(error).__name__}: {error}" if isinstance(error, Exception) else error
+    if verification.attempts >= MAX_ATTEMPTS:
+        verification.status = "Failed"
+        verification.next_attempt = None
+    else:
+        verification.status = "Pending"
+        verification.next_attempt = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (verification.attempts - 1))
+    verification.save(update_fields=["status", "error", "next_attempt"])
+    return verification.status
+
+
+def fulfill(order):
+    # Marks the order paid and creates its enrollments and notifications.
+    # The order row is locked, so two workers cannot fulfil it twice.
+    with transaction.atomic():
+        order = api_models.CartOrder.objects.select_for_update().get(pk=order.pk)
+        if order.payment_status != "Processing":
+            return False
+        order.payment_status = "Paid"
+        order.save(update_fields=["payment_status"])
+
+        items = list(api_models.CartOrderItem.objects.filter(order=order))
+        notifications = [api_models.Notification(user=order.student, order=order, type="Course Enrollment Completed")]
+        notifications += [
+            api_models.Notification(teacher_id=item.teacher_id, order=order, order_item=item, type="New Order")
+            for item in items
+        ]
+        api_models.Notification.objects.bulk_create(notifications)
+        api_models.EnrolledCourse.objects.bulk_create([
+            api_models.EnrolledCourse(course_id=item.course_id, user=order.student, teacher_id=item.teacher_id, order_item=item)
+            for item in items
+        ])
+
+        # bulk_create sends no post_save, so do what the EnrolledCourse
+        # signals would have: bump student counts and drop cached details.
+        counts = Counter(item.course_id for item in items)
+        for course_id, count in counts.items():
+            api_models.CourseStats.add_students(course_id, count)
+        course_ids = list(counts)
+        api_models.Course.objects.filter(pk__in=course_ids).touch()
+        transaction.on_commit(lambda: course_detail_cache.invalidate(*[course_tag(pk) for pk in course_ids]))
+    return True
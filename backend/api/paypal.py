@@ -0,0 +1,139 @@
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+API_BASE = getattr(settings, "PAYPAL_API_BASE", "https://api-m.sandbox.paypal.com")
+# (connect, read) seconds. A stalled PayPal call holds a worker, so these
+# stay well below the gunicorn worker timeout.
+TIMEOUT = getattr(settings, "PAYPAL_TIMEOUT", (3.05, 10))
+POOL_SIZE = getattr(settings, "PAYPAL_POOL_SIZE", 10)
+# Tokens are refreshed this long before PayPal says they expire.
+TOKEN_REFRESH_MARGIN = 300
+BREAKER_FAILURES = getattr(settings, "PAYPAL_BREAKER_FAILURES", 5)
+BREAKER_RESET = getattr(settings, "PAYPAL_BREAKER_RESET", 30)
+
+
+class PayPalError(Exception):
+    pass
+
+
+class CircuitOpen(PayPalError):
+    pass
+
+
+class CircuitBreaker:
+    # Opens after `failures` consecutive errors and rejects calls at once for
+    # `reset` seconds; then a single trial call decides whether it closes.
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self.count = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    def before(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset or self.trial:
+                raise CircuitOpen("PayPal is unavailable, try again shortly")
+            self.trial = True
+
+    def succeeded(self):
+        with self._lock:
+            self.count = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failed(self):
+        with self._lock:
+            self.count += 1
+            self.trial = False
+            if self.count >= self.failures:
+                self.opened_at = time.monotonic()
+
+
+class PayPalClient:
+
+    def __init__(self, client_id, secret, api_base=API_BASE, timeout=TIMEOUT):
+        self.client_id = client_id
+        self.secret = secret
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+        # Keep-alive pool; retries are left to the caller so a slow PayPal
+        # is not hit twice per request.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._token = None
+        self._token_expires = 0
+        self._token_lock = threading.Lock()
+
+    def access_token(self):
+        token = self._token
+        if token and time.monotonic() < self._token_expires:
+            return token
+        with self._token_lock:
+            if self._token and time.monotonic() < self._token_expires:
+                return self._token
+            data = self._request(
+                "POST", "/v1/oauth2/token", data={"grant_type": "client_credentials"}, auth=(self.client_id, self.secret),
+            )
+            self._token = data["access_token"]
+            self._token_expires = time.monotonic() + max(0, int(data.get("expires_in", 0)) - TOKEN_REFRESH_MARGIN)
+            return self._token
+
+    def forget_token(self):
+        with self._token_lock:
+            self._token = None
+
+    def get_order(self, order_id):
+        return self._authorized("GET", f"/v2/checkout/orders/{order_id}")
+
+    def _authorized(self, method, path, **kwargs):
+        try:
+            return self._request(method, path, headers={"Authorization": f"Bearer {self.access_token()}"}, **kwargs)
+        except PayPalError as e:
+            # A token revoked before its expiry: fetch a new one and retry once.
+            if getattr(e, "status_code", None) != 401:
+                raise
+            self.forget_token()
+            return self._request(method, path, headers={"Authorization": f"Bearer {self.access_token()}"}, **kwargs)
+
+    def _request(self, method, path, **kwargs):
+        self.breaker.before()
+        try:
+            response = self.session.request(method, self.api_base + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.breaker.failed()
+            raise PayPalError(f"PayPal request failed: {e}") from e
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.failed()
+        else:
+            self.breaker.succeeded()
+        if response.status_code >= 400:
+            error = PayPalError(f"PayPal returned {response.status_code} for {path}")
+            error.status_code = response.status_code
+            raise error
+        return response.json()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PayPalClient(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET_ID)
+    return _client
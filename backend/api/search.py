@@ -0,0 +1,88 @@
+import re
+
+from django.conf import settings
+from django.db import connection, models
+
+SEARCH_CONFIG = getattr(settings, "COURSE_SEARCH_CONFIG", "english")
+SEARCH_MAX_RESULTS = getattr(settings, "COURSE_SEARCH_MAX_RESULTS", 1000)
+TRIGRAM_THRESHOLD = getattr(settings, "COURSE_SEARCH_TRIGRAM_THRESHOLD", 0.3)
+
+FTS_TABLE = "api_course_fts"
+
+
+def search_courses(queryset, query):
+    query = (query or "").strip()
+    if not query:
+        return queryset
+
+    if connection.vendor == "postgresql":
+        return _postgres_search(queryset, query)
+    if connection.vendor == "sqlite":
+        return _sqlite_search(queryset, query)
+    return queryset.filter(search_document__icontains=query)
+
+
+def _postgres_search(queryset, query):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+
+    # Must stay identical to the expression indexed in migration 0004.
+    vector = SearchVector("search_document", config=SEARCH_CONFIG)
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+
+    results = (
+        queryset.annotate(search=vector)
+        .filter(search=search_query)
+        .annotate(rank=SearchRank(vector, search_query))
+        .order_by("-rank", "-id")
+    )
+    if results.exists():
+        return results
+
+    # Nothing matched the stemmed words, most likely a typo: fall back to
+    # trigram similarity on the title, served by the gin_trgm_ops index.
+    return (
+        queryset.filter(title__trigram_similar=query)
+        .annotate(rank=TrigramSimilarity("title", query))
+        .filter(rank__gte=TRIGRAM_THRESHOLD)
+        .order_by("-rank", "-id")
+    )
+
+
+def _sqlite_search(queryset, query):
+    tokens = re.findall(r"\w+", query.lower())
+    if not tokens:
+        return queryset.none()
+
+    # Quote every token so user input cannot inject FTS5 syntax; the last one
+    # is matched as a prefix since it is usually still being typed.
+    match = " ".join(f'"{token}"' for token in tokens) + "*"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}) LIMIT %s",
+            [match, SEARCH_MAX_RESULTS],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+    if not ids:
+        return queryset.filter(title__icontains=query).order_by("-date", "-id")
+
+    position = models.Case(*[models.When(id=course_id, then=index) for index, course_id in enumerate(ids)], output_field=models.IntegerField())
+    return queryset.filter(id__in=ids).annotate(rank=position).order_by("rank")
+
+
+def index_courses(courses):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for course in courses:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [course.pk])
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, search_document) VALUES (%s, %s)", [course.pk, course.search_document])
+
+
+def unindex_courses(course_ids):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for course_id in course_ids:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [course_id])
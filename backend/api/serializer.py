@@ -1,5 +1,8 @@
 from django.contrib.auth.password_validation import validate_password
 from api import models as api_models
+from api import curriculum
+from api import images
+from api import uploads
 
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
@@ -22,6 +25,19 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         return token
 
 
+class ImageSrcsetField(serializers.Field):
+    # Resized WebP/JPEG variants of an image field as srcset strings.
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return images.srcset(value.name, self.context.get('request'))
+
+
 class UserSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -61,6 +77,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 
 class ProfileSerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField(source='image')
 
     class Meta:
         model = Profile
@@ -68,18 +85,22 @@ class ProfileSerializer(serializers.ModelSerializer):
 
 
 class CategorySerializer(serializers.ModelSerializer):
+    course_count = serializers.IntegerField(source='courses_total', read_only=True)
+    image_srcset = ImageSrcsetField(source='image')
 
     class Meta:
-        fields = ['id','title', 'image', 'slug', 'course_count']
+        fields = ['id','title', 'image', 'image_srcset', 'slug', 'course_count']
         model = api_models.Category
 
 
 class TeacherSerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField(source='image')
     
     class Meta:
         fields = [
             "user",
             "image",
+            "image_srcset",
             "full_name",
             "bio",
             "facebook",
@@ -96,15 +117,32 @@ class TeacherSerializer(serializers.ModelSerializer):
 
 
 
+class CourseStatsSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        fields = ['average_rating', 'rating_count', 'histogram', 'student_count', 'lecture_count']
+        model = api_models.CourseStats
+
+
 class VariantItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         fields = '__all__'
+        read_only_fields = ['poster', 'media_status', 'media_attempts', 'media_error', 'media_next_attempt', 'hls_manifest', 'hls_status', 'hls_attempts', 'hls_error', 'hls_next_attempt']
+        model = api_models.VariantItem
+
+
+class LectureSerializer(serializers.ModelSerializer):
+    # Lecture listing for course and enrollment payloads. Storage names are
+    # left out; media is reached through the gated lesson endpoints.
+
+    class Meta:
+        fields = ['id', 'variant', 'title', 'description', 'duration', 'content_duration', 'preview', 'variant_item_id', 'date', 'media_status']
         model = api_models.VariantItem
 
 
 class VariantSerializer(serializers.ModelSerializer):
-    variant_items = VariantItemSerializer()
+    variant_items = VariantItemSerializer(many=True, read_only=True)
 
     class Meta:
         fields = '__all__'
@@ -192,6 +230,7 @@ class CouponSerializer(serializers.ModelSerializer):
     class Meta:
         fields = '__all__'
         model = api_models.Coupon
+        read_only_fields = ["used_count"]
 
 class WishlistSerializer(serializers.ModelSerializer):
     
@@ -208,9 +247,10 @@ class CountrySerializer(serializers.ModelSerializer):
 
 class EnrolledCourseSerializer(serializers.ModelSerializer):
     
-    lectures = VariantItemSerializer(many=True, read_only=True)
+    lectures = LectureSerializer(many=True, read_only=True)
     completed_lesson = CompletedLessonSerializer(many=True, read_only=True)
-    curriculum = VariantItemSerializer(many=True, read_only=True)
+    curriculum = serializers.SerializerMethodField()
+    curriculum_info = serializers.SerializerMethodField()
     note = NoteSerializer(many=True, read_only=True)
     question_answer = Question_AnswerSerializer(many=True, read_only=True)
     review = ReviewSerializer(many=False, read_only=True)
@@ -220,18 +260,91 @@ class EnrolledCourseSerializer(serializers.ModelSerializer):
         fields = '__all__'
         model = api_models.EnrolledCourse
 
+    def get_curriculum(self, enrollment):
+        return curriculum.render_sections(curriculum.get_snapshot(enrollment.course), self.context.get('request'))
+
+    def get_curriculum_info(self, enrollment):
+        return curriculum.summary(curriculum.get_snapshot(enrollment.course))
+
 
 class CourseSerializer(serializers.ModelSerializer):
     students = EnrolledCourseSerializer(many=True, required=False, read_only=True,)
-    curriculum = VariantSerializer(many=True, required=False, read_only=True,)
-    lectures = VariantItemSerializer(many=True, required=False, read_only=True,)
+    curriculum = serializers.SerializerMethodField()
+    curriculum_info = serializers.SerializerMethodField()
+    lectures = LectureSerializer(many=True, required=False, read_only=True,)
     reviews = ReviewSerializer(many=True, read_only=True, required=False)
+    stats = CourseStatsSerializer(read_only=True)
+    image_srcset = ImageSrcsetField(source='image')
 
 
     class Meta:
-        fields = ["id", "category", "teacher", "file", "image", "title", "description", "price", "language", "level", "platform_status", "teacher_course_status", "featured", "course_id", "slug", "date", "students", "curriculum", "lectures", "average_rating", "rating_count", "reviews",]
+        fields = ["id", "category", "teacher", "file", "image", "image_srcset", "title", "description", "price", "language", "level", "platform_status", "teacher_course_status", "featured", "course_id", "slug", "date", "students", "curriculum", "curriculum_info", "lectures", "average_rating", "rating_count", "stats", "reviews",]
         model = api_models.Course
 
+    def get_curriculum(self, course):
+        return curriculum.render_sections(curriculum.get_snapshot(course), self.context.get('request'))
+
+    def get_curriculum_info(self, course):
+        return curriculum.summary(curriculum.get_snapshot(course))
+
+
+class CourseCatalogCategorySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        fields = ['id', 'title', 'slug']
+        model = api_models.Category
+
+
+class CourseCatalogTeacherSerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField(source='image')
+
+    class Meta:
+        fields = ['id', 'full_name', 'image', 'image_srcset']
+        model = api_models.Teacher
+
+
+class CourseCatalogSerializer(serializers.ModelSerializer):
+    category = CourseCatalogCategorySerializer(read_only=True)
+    teacher = CourseCatalogTeacherSerializer(read_only=True)
+    average_rating = serializers.FloatField(source='stats.average_rating', read_only=True)
+    rating_count = serializers.IntegerField(source='stats.rating_count', read_only=True)
+    students_count = serializers.IntegerField(source='stats.student_count', read_only=True)
+    lectures_count = serializers.IntegerField(source='stats.lecture_count', read_only=True)
+    image_srcset = ImageSrcsetField(source='image')
+
+    class Meta:
+        fields = ["id", "category", "teacher", "image", "image_srcset", "title", "price", "language", "level", "featured", "course_id", "slug", "date", "average_rating", "rating_count", "students_count", "lectures_count",]
+        model = api_models.Course
+
+
+
+class EnrolledCourseSummarySerializer(serializers.ModelSerializer):
+    # "My Learning" card; expects the annotations from
+    # EnrolledCourse.objects.learning_summary().
+    course = CourseCatalogSerializer(read_only=True)
+    total_lessons = serializers.IntegerField(source='course.stats.lecture_count', read_only=True, default=0)
+    completed_lessons = serializers.IntegerField(read_only=True)
+    progress = serializers.SerializerMethodField()
+    last_activity = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        fields = ["id", "enrollment_id", "date", "course", "total_lessons", "completed_lessons", "progress", "last_activity"]
+        model = api_models.EnrolledCourse
+
+    def get_progress(self, enrollment):
+        stats = getattr(enrollment.course, 'stats', None)
+        total = stats.lecture_count if stats else 0
+        if not total:
+            return 0
+        return min(100, round(enrollment.completed_lessons * 100 / total))
+
+
+class AutocompleteSuggestionSerializer(serializers.Serializer):
+    type = serializers.CharField()
+    id = serializers.IntegerField()
+    slug = serializers.CharField()
+    title = serializers.CharField()
+    score = serializers.IntegerField()
 
 
 class StudentSummarySerializer(serializers.Serializer):
@@ -244,4 +357,19 @@ class TeacherSummarySerializer(serializers.Serializer):
     total_courses = serializers.IntegerField(default=0)
     total_students = serializers.IntegerField(default=0)
     total_revenue = serializers.IntegerField(default=0)
-    monthly_revenue = serializers.IntegerField(default=0)
\ No newline at end of file
+    monthly_revenue = serializers.IntegerField(default=0)
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_count = serializers.IntegerField(read_only=True)
+    received_chunks = serializers.SerializerMethodField()
+    missing_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        fields = ["upload_id", "filename", "size", "chunk_size", "chunk_count", "status", "received_chunks", "missing_chunks", "file", "expires"]
+        model = api_models.UploadSession
+
+    def get_received_chunks(self, session):
+        return uploads.received(session)
+
+    def get_missing_chunks(self, session):
+        return uploads.missing(session)
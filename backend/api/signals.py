@@ -0,0 +1,242 @@
+from django.db import models, transaction
+from django.db.models.signals import post_save, pre_save, post_delete
+
+from api import models as api_models
+from api import search
+from api import curriculum
+from api import images
+from api import hls
+from api import cart as api_cart
+from api.autocomplete import autocomplete
+from api.cache import course_detail_cache, course_tag
+from api.coupons import coupon_cache
+from api.storage import BLOB_PREFIX
+from api.tax import tax_table
+from userauths.models import Profile
+
+
+def create_course_stats(sender, instance, created, **kwargs):
+    if created:
+        api_models.CourseStats.objects.get_or_create(course = instance)
+
+
+def index_course(sender, instance, **kwargs):
+    search.index_courses([instance])
+
+
+def unindex_course(sender, instance, **kwargs):
+    search.unindex_courses([instance.pk])
+
+
+def refresh_category_search(sender, instance, **kwargs):
+    search.index_courses(api_models.Course.objects.filter(category = instance).refresh_search_documents())
+
+
+def refresh_teacher_search(sender, instance, **kwargs):
+    search.index_courses(api_models.Course.objects.filter(teacher = instance).refresh_search_documents())
+
+
+def touch_category_courses(sender, instance, **kwargs):
+    api_models.Course.objects.filter(category = instance).touch()
+
+
+def touch_teacher_courses(sender, instance, **kwargs):
+    api_models.Course.objects.filter(teacher = instance).touch()
+
+
+def update_course_suggestions(sender, instance, **kwargs):
+    autocomplete.course_changed(instance)
+
+
+def remove_course_suggestions(sender, instance, **kwargs):
+    autocomplete.removed("course", instance.pk)
+
+
+def update_category_suggestions(sender, instance, **kwargs):
+    autocomplete.category_changed(instance)
+
+
+def remove_category_suggestions(sender, instance, **kwargs):
+    autocomplete.removed("category", instance.pk)
+
+
+def content_course_id(instance):
+    if isinstance(instance, api_models.Course):
+        return instance.pk
+    if isinstance(instance, api_models.VariantItem):
+        return api_models.Variant.objects.filter(pk = instance.variant_id).values_list("course_id", flat = True).first()
+    return instance.course_id
+
+
+def course_content_changed(sender, instance, **kwargs):
+    course_id = content_course_id(instance)
+    if course_id:
+        course_detail_cache.invalidate(course_tag(course_id))
+        if sender in (api_models.Variant, api_models.VariantItem):
+            curriculum.mark_stale(course_id)
+        if sender is not api_models.Course:
+            api_models.Course.objects.filter(pk = course_id).touch()
+
+
+def remember_review_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = sender.objects.filter(pk = instance.pk).values("course_id", "rating", "active").first()
+
+
+def update_review_stats(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_rating", None)
+    if previous and previous["active"]:
+        api_models.CourseStats.add_rating(previous["course_id"], previous["rating"], sign = -1)
+    if instance.active:
+        api_models.CourseStats.add_rating(instance.course_id, instance.rating)
+
+
+def remove_review_stats(sender, instance, **kwargs):
+    if instance.active:
+        api_models.CourseStats.add_rating(instance.course_id, instance.rating, sign = -1)
+
+
+def update_enrollment_stats(sender, instance, created, **kwargs):
+    if created:
+        api_models.CourseStats.add_students(instance.course_id)
+
+
+def remove_enrollment_stats(sender, instance, **kwargs):
+    api_models.CourseStats.add_students(instance.course_id, -1)
+
+
+def update_lecture_stats(sender, instance, created, **kwargs):
+    if created:
+        api_models.CourseStats.add_lectures(instance.variant_id)
+
+
+def remove_lecture_stats(sender, instance, **kwargs):
+    api_models.CourseStats.add_lectures(instance.variant_id, -1)
+
+
+def file_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+
+
+def remember_stored_files(sender, instance, update_fields = None, **kwargs):
+    # File names as stored before this save, for the fields being saved.
+    fields = [field for field in file_fields(sender) if update_fields is None or field.name in update_fields]
+    instance._previous_files = {}
+    instance._acquired_files = set()
+    if instance.pk and fields:
+        instance._previous_files = sender.objects.filter(pk = instance.pk).values(*[field.attname for field in fields]).first() or {}
+        # An uncommitted file is uploaded by this save and takes a new
+        # reference even when its content, and so its name, is unchanged.
+        instance._acquired_files = {field.attname for field in fields if getattr(instance, field.attname) and not getattr(instance, field.attname)._committed}
+
+
+def release_stored_file(storage, name):
+    # Only content-addressed blobs are reference counted; anything else
+    # (defaults such as default.jpg, generated trees) is left alone.
+    if name and name.startswith(BLOB_PREFIX + "/"):
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def release_replaced_files(sender, instance, **kwargs):
+    acquired = getattr(instance, "_acquired_files", set())
+    for attname, previous in getattr(instance, "_previous_files", {}).items():
+        fieldfile = getattr(instance, attname)
+        if previous and (previous != fieldfile.name or attname in acquired):
+            release_stored_file(fieldfile.storage, previous)
+
+
+def release_deleted_files(sender, instance, **kwargs):
+    for field in file_fields(sender):
+        fieldfile = getattr(instance, field.attname)
+        release_stored_file(fieldfile.storage, fieldfile.name)
+
+
+def delete_replaced_hls_package(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_files", {}).get("hls_manifest")
+    if previous and previous != instance.hls_manifest.name:
+        storage = instance.hls_manifest.storage
+        transaction.on_commit(lambda: hls.delete_package(storage, previous))
+
+
+def delete_hls_package(sender, instance, **kwargs):
+    if instance.hls_manifest:
+        storage, name = instance.hls_manifest.storage, instance.hls_manifest.name
+        transaction.on_commit(lambda: hls.delete_package(storage, name))
+
+
+def invalidate_tax_table(sender, instance, **kwargs):
+    tax_table.invalidate()
+
+
+def invalidate_cart_summary(sender, instance, **kwargs):
+    api_cart.invalidate(instance.cart_id)
+
+
+def forget_coupon(sender, instance, **kwargs):
+    coupon_cache.forget(instance.code)
+
+
+post_save.connect(create_course_stats, sender=api_models.Course)
+post_save.connect(index_course, sender=api_models.Course)
+post_delete.connect(unindex_course, sender=api_models.Course)
+post_save.connect(refresh_category_search, sender=api_models.Category)
+post_save.connect(refresh_teacher_search, sender=api_models.Teacher)
+post_save.connect(touch_category_courses, sender=api_models.Category)
+post_save.connect(touch_teacher_courses, sender=api_models.Teacher)
+post_save.connect(update_course_suggestions, sender=api_models.Course)
+post_delete.connect(remove_course_suggestions, sender=api_models.Course)
+post_save.connect(update_category_suggestions, sender=api_models.Category)
+post_delete.connect(remove_category_suggestions, sender=api_models.Category)
+pre_save.connect(remember_review_rating, sender=api_models.Review)
+post_save.connect(update_review_stats, sender=api_models.Review)
+post_delete.connect(remove_review_stats, sender=api_models.Review)
+post_save.connect(update_enrollment_stats, sender=api_models.EnrolledCourse)
+post_delete.connect(remove_enrollment_stats, sender=api_models.EnrolledCourse)
+post_save.connect(update_lecture_stats, sender=api_models.VariantItem)
+post_delete.connect(remove_lecture_stats, sender=api_models.VariantItem)
+post_save.connect(delete_replaced_hls_package, sender=api_models.VariantItem)
+post_delete.connect(delete_hls_package, sender=api_models.VariantItem)
+post_save.connect(invalidate_tax_table, sender=api_models.Country)
+post_delete.connect(invalidate_tax_table, sender=api_models.Country)
+post_save.connect(invalidate_cart_summary, sender=api_models.Cart)
+post_delete.connect(invalidate_cart_summary, sender=api_models.Cart)
+post_save.connect(forget_coupon, sender=api_models.Coupon)
+post_delete.connect(forget_coupon, sender=api_models.Coupon)
+
+# Everything CourseSerializer renders for a course detail page.
+COURSE_CONTENT_MODELS = [
+    api_models.Course,
+    api_models.Variant,
+    api_models.VariantItem,
+    api_models.Review,
+    api_models.EnrolledCourse,
+    api_models.CompletedLesson,
+    api_models.Note,
+    api_models.Question_Answer,
+    api_models.Question_Answer_Message,
+]
+
+for model in COURSE_CONTENT_MODELS:
+    post_save.connect(course_content_changed, sender=model)
+    post_delete.connect(course_content_changed, sender=model)
+
+
+def forget_overwritten_image(sender, instance, **kwargs):
+    # Storages that overwrite in place (S3 by default) reuse the old name,
+    # so derivatives rendered from the previous file must go.
+    image = instance.image
+    if image and not image._committed:
+        images.forget(image.field.generate_filename(instance, image.name))
+
+
+for model in [api_models.Course, api_models.Teacher, api_models.Category, Profile]:
+    pre_save.connect(forget_overwritten_image, sender=model)
+
+
+# Models whose files may be shared blobs; a replaced or deleted file drops
+# its reference once the change commits.
+for model in [api_models.Course, api_models.VariantItem, api_models.Teacher, api_models.Category, Profile]:
+    pre_save.connect(remember_stored_files, sender=model)
+    post_save.connect(release_replaced_files, sender=model)
+    post_delete.connect(release_deleted_files, sender=model)
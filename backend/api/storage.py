@@ -0,0 +1,151 @@
+import hashlib
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from storages.backends.s3boto3 import S3Boto3Storage
+
+# Uploads under these prefixes (the upload_to of course, lesson, teacher
+# and profile files) are stored once per distinct content. Generated trees
+# such as course-hls/ and image-derivatives/ keep their own names.
+CONTENT_ADDRESSED_PREFIXES = getattr(settings, "CONTENT_ADDRESSED_PREFIXES", ("course-file/", "user_folder/"))
+BLOB_PREFIX = "blobs"
+
+
+class HashingUploadMixin:
+    # Hashes each upload while Django streams it in, so the storage does not
+    # have to read the file a second time to find its digest.
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if getattr(self, "activated", True):
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_sha256 = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def content_digest(content):
+    digest = getattr(content, "content_sha256", None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+class ContentAddressedMixin:
+    # Files are stored as blobs/<xx>/<sha256><ext> with a StoredBlob row
+    # counting the model fields that point at them. Saving content that is
+    # already stored only bumps the count; delete() drops one reference and
+    # removes the object with the last one.
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not any(name.startswith(prefix) for prefix in CONTENT_ADDRESSED_PREFIXES):
+            return super().save(name, content, max_length=max_length)
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        digest = content_digest(content)
+        extension = os.path.splitext(name)[1].lower()
+        blob_name, created = self.acquire(digest, posixpath.join(BLOB_PREFIX, digest[:2], digest + extension), content.size)
+        if created and not self.exists(blob_name):
+            try:
+                self._save(blob_name, content)
+            except FileExistsError:
+                pass
+            except Exception:
+                self.release(blob_name)
+                raise
+        return blob_name
+
+    def adopt(self, temp_name, digest, extension, size):
+        # Turns an object assembled elsewhere (chunked uploads) into a blob,
+        # discarding it when the content is already stored.
+        blob_name, created = self.acquire(digest, posixpath.join(BLOB_PREFIX, digest[:2], digest + extension), size)
+        if created and not self.exists(blob_name):
+            self._move(temp_name, blob_name)
+        else:
+            super().delete(temp_name)
+        return blob_name
+
+    def acquire(self, digest, name, size):
+        from api.models import StoredBlob
+
+        blob = StoredBlob.objects.filter(digest=digest).values_list("name", flat=True).first()
+        if blob is not None and StoredBlob.objects.filter(digest=digest).update(refcount=F("refcount") + 1):
+            return blob, False
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.create(digest=digest, name=name, size=size or 0, refcount=1)
+            return name, True
+        except IntegrityError:
+            StoredBlob.objects.filter(digest=digest).update(refcount=F("refcount") + 1)
+            return StoredBlob.objects.get(digest=digest).name, False
+
+    def release(self, name):
+        from api.models import StoredBlob
+
+        # The row stays locked until the object is gone, so a concurrent
+        # save of the same content waits and then uploads it again.
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return None
+            if blob.refcount > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") - 1)
+                return False
+            blob.delete()
+            super().delete(name)
+            return True
+
+    def delete(self, name):
+        if name.startswith(BLOB_PREFIX + "/"):
+            self.release(name)
+        else:
+            super().delete(name)
+
+
+class ContentAddressedS3Storage(ContentAddressedMixin, S3Boto3Storage):
+
+    def _move(self, source, target):
+        # Server-side copy; boto3 switches to multipart copy above 5 GB.
+        self.bucket.Object(self._normalize_name(target)).copy(
+            {"Bucket": self.bucket.name, "Key": self._normalize_name(source)}
+        )
+        self.bucket.Object(self._normalize_name(source)).delete()
+
+
+class ContentAddressedFileSystemStorage(ContentAddressedMixin, FileSystemStorage):
+
+    def _move(self, source, target):
+        path = self.path(target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self.path(source), path)
@@ -0,0 +1,155 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 256 * 1024
+
+# "nginx" hands the file to an internal location via X-Accel-Redirect,
+# "apache" via X-Sendfile; empty serves from the worker, where gunicorn
+# passes the open file to os.sendfile().
+SENDFILE_BACKEND = getattr(settings, "MEDIA_SENDFILE_BACKEND", "")
+ACCEL_PREFIX = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class MediaTokenAuthentication(JWTAuthentication):
+    # <video> and <source> elements cannot send an Authorization header, so
+    # the access token may also be passed as ?token=.
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        token = request.query_params.get("token")
+        if header is not None or not token:
+            return super().authenticate(request)
+        validated = self.get_validated_token(token.encode())
+        return self.get_user(validated), validated
+
+
+class FileRange:
+    # Reads at most `length` bytes from a file already positioned at the
+    # start of the range. fileno() lets gunicorn's wsgi.file_wrapper send the
+    # range with os.sendfile() instead of copying it through Python.
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    # Only single ranges are honoured; anything else gets the full body,
+    # which RFC 9110 allows.
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    elif last:
+        if int(last) == 0:
+            raise RangeNotSatisfiable
+        start = max(0, size - int(last))
+        end = size - 1
+    else:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def serve(request, fieldfile):
+    storage = fieldfile.storage
+    try:
+        path = storage.path(fieldfile.name)
+    except NotImplementedError:
+        # Remote storages answer ranges themselves; send the client there.
+        return HttpResponseRedirect(fieldfile.url)
+
+    if not os.path.isfile(path):
+        return HttpResponse(status=404)
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = quote_etag(f"{stat.st_mtime_ns:x}-{size:x}")
+    last_modified = int(stat.st_mtime)
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return with_validators(response, etag, last_modified)
+
+    byte_range = None
+    if if_range_matches(request.META.get("HTTP_IF_RANGE"), etag, last_modified):
+        try:
+            byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return with_validators(response, etag, last_modified)
+
+    if SENDFILE_BACKEND:
+        # The front-end server reads the file and handles Range itself.
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, "/")
+        if SENDFILE_BACKEND == "nginx":
+            response["X-Accel-Redirect"] = ACCEL_PREFIX.rstrip("/") + "/" + relative
+        else:
+            response["X-Sendfile"] = path
+        return with_validators(response, etag, last_modified)
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type)
+    else:
+        f = open(path, "rb")
+        f.seek(start)
+        response = FileResponse(FileRange(f, length), content_type=content_type)
+        response.block_size = BLOCK_SIZE
+    response["Content-Length"] = length
+    if byte_range:
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return with_validators(response, etag, last_modified)
+
+
+def if_range_matches(header, etag, last_modified):
+    if not header:
+        return True
+    if header.startswith(('"', 'W/')):
+        return header == etag
+    return parse_http_date_safe(header) == last_modified
+
+
+def with_validators(response, etag, last_modified):
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
@@ -0,0 +1,87 @@
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = "tax-table:version"
+# Bounds staleness when the default cache is per-process (locmem), so a
+# Country edit made in another worker is still picked up.
+MAX_AGE = getattr(settings, "TAX_TABLE_MAX_AGE", 300)
+DEFAULT_COUNTRY = getattr(settings, "TAX_DEFAULT_COUNTRY", "Kazakhstan")
+CENT = Decimal("0.01")
+
+
+def fee(price, rate):
+    return (Decimal(price) * rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class TaxTable:
+    # Active Country rows keyed by name, held in memory. Country signals
+    # bump a version in the shared cache; each process rebuilds when its
+    # copy is older than that version.
+
+    def __init__(self):
+        self.rates = None
+        self.version = None
+        self.built_at = 0
+        self._lock = threading.Lock()
+
+    def _ensure_fresh(self):
+        version = cache.get(VERSION_KEY, 0)
+        rates = self.rates
+        if rates is not None and self.version == version and time.monotonic() - self.built_at < MAX_AGE:
+            return rates
+        with self._lock:
+            rates = self.rates
+            if rates is None or self.version != version or time.monotonic() - self.built_at >= MAX_AGE:
+                rates = self.rebuild(version)
+        return rates
+
+    def rebuild(self, version=None):
+        from api import models as api_models
+
+        rows = api_models.Country.objects.filter(active=True).values_list("name", "tax_rate")
+        rates = {name: Decimal(rate) / 100 for name, rate in rows}
+        self.version = cache.get(VERSION_KEY, 0) if version is None else version
+        self.built_at = time.monotonic()
+        self.rates = rates
+        return rates
+
+    def lookup(self, country_name):
+        # Returns (country, rate); unknown or inactive countries fall back to
+        # the default country name with no tax, as the cart always has.
+        rates = self._ensure_fresh()
+        if country_name in rates:
+            return country_name, rates[country_name]
+        return DEFAULT_COUNTRY, Decimal(0)
+
+    def tax(self, price, country_name):
+        _, rate = self.lookup(country_name)
+        return fee(price, rate)
+
+    def prices(self, prices, country_name):
+        # prices: {key: price}. Returns {key: (price, tax_fee, total)}.
+        _, rate = self.lookup(country_name)
+        result = {}
+        for key, price in prices.items():
+            price = Decimal(price)
+            tax_fee = fee(price, rate)
+            result[key] = (price, tax_fee, price + tax_fee)
+        return result
+
+    def invalidate(self):
+        def bump():
+            cache.add(VERSION_KEY, 0, timeout=None)
+            try:
+                cache.incr(VERSION_KEY)
+            except ValueError:
+                cache.set(VERSION_KEY, 1, timeout=None)
+            self.rates = None
+
+        transaction.on_commit(bump)
+
+
+tax_table = TaxTable()
@@ -0,0 +1,241 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from api import models as api_models
+
+DEFAULT_CHUNK_SIZE = getattr(settings, "UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)
+# S3 rejects multipart parts under 5 MiB (except the last) and more than
+# 10,000 parts per upload.
+MIN_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_CHUNKS = 10000
+MAX_UPLOAD_SIZE = getattr(settings, "UPLOAD_MAX_SIZE", 20 * 1024 ** 3)
+SESSION_TTL = timedelta(hours=getattr(settings, "UPLOAD_SESSION_HOURS", 24))
+READ_BLOCK = 1024 * 1024
+TEMP_PREFIX = "uploads"
+
+
+class UploadError(Exception):
+    pass
+
+
+class LocalBackend:
+    # Chunks are written in place with pwrite() into a preallocated file, so
+    # parallel PUTs for different chunks never contend.
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def start(self, session):
+        path = self.storage.path(session.temp_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.truncate(session.size)
+
+    def write_chunk(self, session, index, spool, length):
+        offset = index * session.chunk_size
+        fd = os.open(self.storage.path(session.temp_name), os.O_WRONLY)
+        try:
+            while True:
+                data = spool.read(READ_BLOCK)
+                if not data:
+                    break
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+        finally:
+            os.close(fd)
+        return None
+
+    def complete(self, session, chunks):
+        pass
+
+    def digest(self, session):
+        hasher = hashlib.sha256()
+        with open(self.storage.path(session.temp_name), "rb") as f:
+            while True:
+                data = f.read(READ_BLOCK)
+                if not data:
+                    break
+                hasher.update(data)
+        return hasher.hexdigest()
+
+    def abort(self, session):
+        if self.storage.exists(session.temp_name):
+            self.storage.delete(session.temp_name)
+
+
+class S3Backend:
+    # One S3 multipart upload per session; each chunk is one part, so parts
+    # go straight to the bucket and can arrive in any order.
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.client = storage.bucket.meta.client
+        self.bucket = storage.bucket.name
+
+    def key(self, session):
+        return self.storage._normalize_name(session.temp_name)
+
+    def start(self, session):
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key(session))
+        session.storage_upload_id = response["UploadId"]
+
+    def write_chunk(self, session, index, spool, length):
+        # The spool is streamed as the request body; a failed upload_part
+        # leaves any earlier copy of the part in place.
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key(session), UploadId=session.storage_upload_id,
+            PartNumber=index + 1, Body=spool, ContentLength=length,
+        )
+        return response["ETag"]
+
+    def complete(self, session, chunks):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key(session), UploadId=session.storage_upload_id,
+            MultipartUpload={"Parts": [{"ETag": chunk.etag, "PartNumber": chunk.index + 1} for chunk in chunks]},
+        )
+
+    def digest(self, session):
+        # Streamed from the bucket rather than opened through the storage,
+        # which would spool the whole object to local disk first.
+        hasher = hashlib.sha256()
+        body = self.client.get_object(Bucket=self.bucket, Key=self.key(session))["Body"]
+        for data in body.iter_chunks(READ_BLOCK):
+            hasher.update(data)
+        return hasher.hexdigest()
+
+    def abort(self, session):
+        if session.storage_upload_id:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key(session), UploadId=session.storage_upload_id)
+
+
+def backend(storage=default_storage):
+    if hasattr(storage, "bucket"):
+        return S3Backend(storage)
+    return LocalBackend(storage)
+
+
+def start(teacher, filename, size, chunk_size=None):
+    if size <= 0 or size > MAX_UPLOAD_SIZE:
+        raise UploadError(f"File size must be between 1 byte and {MAX_UPLOAD_SIZE} bytes")
+    chunk_size = min(max(chunk_size or DEFAULT_CHUNK_SIZE, MIN_CHUNK_SIZE, -(-size // MAX_CHUNKS)), MAX_CHUNK_SIZE)
+
+    session = api_models.UploadSession(
+        teacher=teacher, filename=os.path.basename(filename)[:255], size=size, chunk_size=chunk_size,
+        expires=timezone.now() + SESSION_TTL,
+    )
+    session.temp_name = posixpath.join(TEMP_PREFIX, f"{session.upload_id}.part")
+    backend().start(session)
+    session.save()
+    return session
+
+
+def write_chunk(session, index, stream, length, sha256=None):
+    if session.status != "Active" or session.expires < timezone.now():
+        raise UploadError("Upload session is no longer active")
+    if not 0 <= index < session.chunk_count():
+        raise UploadError(f"Chunk index must be between 0 and {session.chunk_count() - 1}")
+    if length != session.chunk_length(index):
+        raise UploadError(f"Chunk {index} must be exactly {session.chunk_length(index)} bytes")
+
+    # The body is spooled (in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE, then
+    # on disk) and checked before anything is written, so a truncated or
+    # corrupt retry never touches a chunk that was already stored.
+    with tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, dir=settings.FILE_UPLOAD_TEMP_DIR) as spool:
+        digest = spool_chunk(stream, spool, length)
+        if sha256 and sha256.lower() != digest:
+            raise UploadError("Chunk checksum mismatch")
+
+        # The stored chunk is about to be overwritten; dropping its record
+        # first means a write that fails halfway leaves the chunk missing
+        # rather than recorded with the old digest.
+        api_models.UploadChunk.objects.filter(session=session, index=index).delete()
+        spool.seek(0)
+        etag = backend().write_chunk(session, index, spool, length)
+
+    chunk, _ = api_models.UploadChunk.objects.update_or_create(
+        session=session, index=index, defaults={"size": length, "sha256": digest, "etag": etag, "date": timezone.now()},
+    )
+    return chunk
+
+
+def spool_chunk(stream, spool, length):
+    hasher = hashlib.sha256()
+    remaining = length
+    while remaining:
+        data = stream.read(min(READ_BLOCK, remaining))
+        if not data:
+            raise UploadError("Chunk body ended early")
+        spool.write(data)
+        hasher.update(data)
+        remaining -= len(data)
+    return hasher.hexdigest()
+
+
+def received(session):
+    return list(session.chunks.order_by("index").values_list("index", flat=True))
+
+
+def missing(session):
+    have = set(received(session))
+    return [index for index in range(session.chunk_count()) if index not in have]
+
+
+def finish(session, item):
+    with transaction.atomic():
+        session = api_models.UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status == "Complete":
+            return session
+        if session.status != "Active":
+            raise UploadError("Upload session is no longer active")
+
+        chunks = list(session.chunks.order_by("index"))
+        if len(chunks) != session.chunk_count():
+            raise UploadError(f"{session.chunk_count() - len(chunks)} chunks are still missing")
+
+        storage = default_storage
+        store = backend(storage)
+        store.complete(session, chunks)
+        # Chunks arrive in any order, so the blob digest is taken by reading
+        # the assembled file once: the same bytes then share a blob with a
+        # plain multipart upload whatever the chunk size. The chunk digests
+        # only verify each chunk as it arrives.
+        extension = os.path.splitext(session.filename)[1].lower()
+        session.file = storage.adopt(session.temp_name, store.digest(session), extension, session.size)
+        session.status = "Complete"
+        session.save(update_fields=["file", "status"])
+
+        previous = item.file.name if item.file else None
+        item.file.name = session.file
+        item.queue_media()
+        item.save()
+
+    # A different old file is released by the VariantItem signals. The same
+    # content uploaded again keeps its name, so undo the extra reference
+    # adopt() took here.
+    if previous == session.file:
+        storage.delete(previous)
+    return session
+
+
+def abort(session):
+    backend().abort(session)
+    session.status = "Aborted"
+    session.save(update_fields=["status"])
+    session.chunks.all().delete()
+
+
+def purge_expired():
+    count = 0
+    for session in api_models.UploadSession.objects.filter(status="Active", expires__lt=timezone.now()).iterator():
+        abort(session)
+        count += 1
+    return count
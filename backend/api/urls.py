@@ -23,17 +23,28 @@ urlpatterns = [
     #Core Endpoints
     path("course/category/", api_views.CategoryListAPIView.as_view()),
     path("course/course-list/", api_views.CourseListAPIView.as_view()),
+    path("course/browse/", api_views.CourseBrowseAPIView.as_view()),
     path("courses/search", api_views.SearchCourseAPIView.as_view()),
+    path("courses/autocomplete", api_views.CourseAutocompleteAPIView.as_view()),
     path("course/course-detail/<slug>/", api_views.CourseDetailAPIView.as_view()),
+    path("course/cache-stats/", api_views.CourseDetailCacheStatsAPIView.as_view()),
+    path("media/course/<course_id>/", api_views.CourseMediaAPIView.as_view()),
+    path("media/image/<path:name>", api_views.ImageDerivativeAPIView.as_view(), name="image-derivative"),
+    path("media/lesson/<variant_item_id>/", api_views.VariantItemMediaAPIView.as_view(), name="lesson-media"),
+    path("media/lesson/<variant_item_id>/poster/", api_views.VariantItemPosterAPIView.as_view(), name="lesson-poster"),
+    path("media/lesson/<variant_item_id>/hls/<path:name>", api_views.VariantItemHLSAPIView.as_view(), name="lesson-hls"),
     path("course/cart/", api_views.CartAPIView.as_view()),
     path("course/cart-list/<cart_id>/", api_views.CartListAPIView.as_view()),
+    path("course/price-with-tax/", api_views.CoursePriceWithTaxAPIView.as_view()),
     path("course/cart-item-delete/<cart_id>/<item_id>/", api_views.CartItemDeleteAPIView.as_view()),
     path("cart/stats/<cart_id>/", api_views.CartStatsAPIView.as_view()),
+    path("cart/detail/<cart_id>/", api_views.CartDetailAPIView.as_view()),
     path("order/create-order/", api_views.CreateOrderAPIView.as_view()),
     path("order/checkout/<oid>/", api_views.CheckoutAPIView.as_view()),
     path("order/coupon/", api_views.CouponApplyAPIView.as_view()),
     # path("payment/stripe-checkout/<order_oid>/", api_views.StripeCheckoutAPIView.as_view()),
     path("payment/payment-success/", api_views.PaymentSuccessAPIView.as_view()),
+    path("payment/status/<order_oid>/", api_views.PaymentStatusAPIView.as_view()),
 
     #Student API Endpoints
 
@@ -69,4 +80,8 @@ urlpatterns = [
     path("teacher/course-detail/<slug>/", api_views.CourseDetailAPIView.as_view()),
     path("teacher/course/variant-delete/<variant_id>/<teacher_id>/<course_id>/", api_views.CourseVariantDeleteAPIView.as_view()),
     path("teacher/course/variant-item-delete/<variant_id>/<variant_item_id>/<teacher_id>/<course_id>/", api_views.CourseVariantItemDeleteAPIVIew.as_view()),
+    path("teacher/upload/init/", api_views.UploadSessionCreateAPIView.as_view()),
+    path("teacher/upload/<teacher_id>/<upload_id>/", api_views.UploadSessionDetailAPIView.as_view()),
+    path("teacher/upload/<teacher_id>/<upload_id>/finalize/", api_views.UploadSessionFinalizeAPIView.as_view()),
+    path("teacher/upload/<teacher_id>/<upload_id>/<int:index>/", api_views.UploadChunkAPIView.as_view()),
 ]
\ No newline at end of file
@@ -2,6 +2,21 @@ from django.shortcuts import render, redirect
 
 from api import serializer as api_serializer
 from api import models as api_models
+from api import search
+from api import facets
+from api import hls
+from api import images
+from api import payments
+from api import cart as api_cart
+from api import coupons
+from api import streaming
+from api import uploads
+from api.autocomplete import autocomplete
+from api.cache import course_detail_cache, course_tag
+from api.conditional import ConditionalGetMixin
+from api.idempotency import IdempotentMixin
+from api.pagination import CartPagination, SearchResultsPagination
+from api.tax import fee, tax_table
 
 
 
@@ -11,22 +26,25 @@ from api import models as api_models
 
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework import generics, status, viewsets
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, ValidationError
 
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.contrib.auth.hashers import check_password
+from django.db.models.fields.files import FieldFile
 from django.db.models.functions import ExtractMonth
+from django.http import HttpResponse
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
      
-import requests
 import random
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
 from datetime import datetime, timedelta
 from distutils.util import strtobool
 
@@ -36,10 +54,6 @@ from userauths.models import User, Profile
 
 # stripe_api_key = settings.STRIPE_API_KEY
 
-
-PAYPAL_CLIENT_ID = settings.PAYPAL_CLIENT_ID
-PAYPAL_SECRET_ID = settings.PAYPAL_SECRET_ID
-
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = api_serializer.MyTokenObtainPairSerializer
 
@@ -144,26 +158,201 @@ class ChangePasswordAPIView(generics.CreateAPIView):
 
 
 
-class CategoryListAPIView(generics.ListAPIView):
-    queryset = api_models.Category.objects.filter(active = True)
+class CategoryListAPIView(ConditionalGetMixin, generics.ListAPIView):
+    queryset = api_models.Category.objects.filter(active = True).annotate(courses_total = models.Count("course"))
     serializer_class = api_serializer.CategorySerializer
     permission_classes = [AllowAny]
+    cursor_ordering = ('title', 'id')
+
+    def get_validators(self):
+        summary = api_models.Category.objects.filter(active = True).aggregate(
+            count = models.Count("id", distinct = True),
+            last = models.Max("updated"),
+            courses = models.Count("course"),
+            last_course = models.Max("course__updated"),
+        )
+        last_modified = max(filter(None, [summary["last"], summary["last_course"]]), default = None)
+        return (summary["count"], summary["courses"], last_modified), last_modified
 
-class CourseListAPIView(generics.ListAPIView):
-    queryset = api_models.Course.objects.filter(platform_status = "Published",teacher_course_status = "Published")
-    serializer_class = api_serializer.CourseSerializer
+class CourseListAPIView(ConditionalGetMixin, generics.ListAPIView):
+    queryset = api_models.Course.objects.published().catalog()
+    serializer_class = api_serializer.CourseCatalogSerializer
     permission_classes = [AllowAny]
 
-class CourseDetailAPIView(generics.RetrieveDestroyAPIView):
+    def get_validators(self):
+        summary = api_models.Course.objects.published().aggregate(count = models.Count("id"), last = models.Max("updated"))
+        return (summary["count"], summary["last"]), summary["last"]
+
+class CourseBrowseAPIView(generics.ListAPIView):
+    serializer_class = api_serializer.CourseCatalogSerializer
+    permission_classes = [AllowAny]
+
+    def get_filters(self):
+        if not hasattr(self, '_filters'):
+            try:
+                self._filters = facets.parse_filters(self.request.GET)
+            except facets.FacetError as e:
+                raise ValidationError({"message": str(e)})
+        return self._filters
+
+    def get_queryset(self):
+        return facets.apply_filters(api_models.Course.objects.published().catalog(), self.get_filters())
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['facets'] = facets.facet_counts(api_models.Course.objects.published(), self.get_filters())
+        return response
+
+class CourseDetailAPIView(ConditionalGetMixin, generics.RetrieveDestroyAPIView):
     serializer_class = api_serializer.CourseSerializer
     permission_classes = [AllowAny]
 
+    def get_validators(self):
+        version = api_models.Course.objects.published().filter(slug = self.kwargs['slug']).values_list("id", "updated").first()
+        if version is None:
+            return None
+        return version, version[1]
+
     def get_object(self):
         slug = self.kwargs['slug']
-        course = api_models.Course.objects.get(slug=slug, platform_status = "Published",teacher_course_status = "Published")
+        course = api_models.Course.objects.select_related("stats", "curriculum_snapshot").get(slug=slug, platform_status = "Published",teacher_course_status = "Published")
         return course
+
+    def retrieve(self, request, *args, **kwargs):
+        slug = self.kwargs['slug']
+        data = course_detail_cache.get(slug)
+        cache_status = "HIT"
+
+        if data is None:
+            course = self.get_object()
+            versions = course_detail_cache.versions([course_tag(course.pk)])
+            data = dict(self.get_serializer(course).data)
+            course_detail_cache.set(slug, data, versions=versions)
+            cache_status = "MISS"
+
+        response = Response(data)
+        response["X-Cache"] = cache_status
+        return response
+
+
+class CourseDetailCacheStatsAPIView(generics.RetrieveAPIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(course_detail_cache.stats())
+
+
+class MediaFileAPIView(generics.GenericAPIView):
+    authentication_classes = [streaming.MediaTokenAuthentication]
+    permission_classes = [AllowAny]
+
+    def get_media(self):
+        # Returns (file, course, is_preview)
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        fieldfile, course, preview = self.get_media()
+        if not fieldfile:
+            raise NotFound("No media file")
+        if not preview and not self.can_stream(request.user, course):
+            self.permission_denied(request, message="Enroll in this course to watch this lesson")
+        return self.serve(request, fieldfile)
+
+    def serve(self, request, fieldfile):
+        return streaming.serve(request, fieldfile)
+
+    def can_stream(self, user, course):
+        if not user.is_authenticated:
+            return False
+        if user.is_staff or (course.teacher is not None and course.teacher.user_id == user.id):
+            return True
+        return api_models.EnrolledCourse.objects.filter(course=course, user=user).exists()
+
+
+class ImageDerivativeAPIView(generics.GenericAPIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            width = int(request.query_params.get('w', images.WIDTHS[0]))
+        except ValueError:
+            raise ValidationError({"w": "Width must be a number"})
+        fmt = request.query_params.get('fmt', 'webp')
+        if width not in images.WIDTHS:
+            raise ValidationError({"w": f"Width must be one of {', '.join(map(str, images.WIDTHS))}"})
+        if fmt not in images.FORMATS:
+            raise ValidationError({"fmt": f"Format must be one of {', '.join(images.FORMATS)}"})
+
+        derivative = images.get_derivative(self.kwargs['name'], width, fmt)
+        if derivative is None:
+            raise NotFound("Image not found")
+        response = redirect(derivative.file.url)
+        response['Cache-Control'] = images.redirect_cache_control(derivative.file.storage)
+        return response
+
+
+class CourseMediaAPIView(MediaFileAPIView):
+
+    def get_media(self):
+        course = api_models.Course.objects.select_related("teacher").filter(course_id=self.kwargs['course_id']).first()
+        if course is None:
+            raise NotFound("Course not found")
+        published = api_models.Course.objects.published().filter(pk=course.pk).exists()
+        return course.file, course, published
+
+
+class VariantItemMediaAPIView(MediaFileAPIView):
+
+    def get_media(self):
+        item = (api_models.VariantItem.objects.select_related("variant__course__teacher")
+                .filter(variant_item_id=self.kwargs['variant_item_id']).first())
+        if item is None:
+            raise NotFound("Lesson not found")
+        self.item = item
+        course = item.variant.course
+        preview = item.preview and api_models.Course.objects.published().filter(pk=course.pk).exists()
+        return item.file, course, preview
+
+
+class VariantItemPosterAPIView(VariantItemMediaAPIView):
+
+    def get_media(self):
+        _, course, preview = super().get_media()
+        return self.item.poster, course, preview
+
+
+class VariantItemHLSAPIView(VariantItemMediaAPIView):
+    # Playlists and segments of a lesson's HLS package, behind the same
+    # enrollment check as the lesson file.
+
+    def get_media(self):
+        _, course, preview = super().get_media()
+        item = self.item
+        if item.hls_status != "Ready" or not item.hls_manifest:
+            raise NotFound("Lesson is not packaged for streaming")
+        name = hls.package_name(item.hls_manifest.name, self.kwargs['name'])
+        if name is None:
+            raise NotFound("No media file")
+        return FieldFile(item, item.hls_manifest.field, name), course, preview
+
+    def serve(self, request, fieldfile):
+        if not fieldfile.name.endswith(".m3u8"):
+            # Segments: served locally, or a redirect to a signed URL.
+            return streaming.serve(request, fieldfile)
+        # Playlists are always answered here, so their relative children
+        # resolve against this endpoint rather than the bucket.
+        try:
+            with fieldfile.storage.open(fieldfile.name, "rb") as f:
+                text = f.read().decode()
+        except FileNotFoundError:
+            raise NotFound("No media file")
+        token = request.query_params.get('token')
+        response = HttpResponse(hls.rewrite_playlist(text, urlencode({"token": token}) if token else ""),
+                                content_type="application/vnd.apple.mpegurl")
+        response['Cache-Control'] = 'private, no-cache'
+        return response
     
-class CartAPIView(generics.CreateAPIView):
+class CartAPIView(IdempotentMixin, generics.CreateAPIView):
     queryset = api_models.Cart.objects.all()
     serializer_class = api_serializer.CartSerializer
     permission_classes =[AllowAny]
@@ -182,25 +371,27 @@ class CartAPIView(generics.CreateAPIView):
         else:
             user = None
 
-        try:
-            country_object = api_models.Country.objects.filter(name= country_name).first()
-            country = country_object.name
-        except:
-            country_object = None
-            country = "Kazakhstan"
-
-        if country_object:
-            tax_rate = country_object.tax_rate / 100
-        else:
-            tax_rate = 0
+        if course is None:
+            raise NotFound("Course not found")
 
+        country, tax_rate = tax_table.lookup(country_name)
+        tax_fee = fee(price, tax_rate)
+
+        # Anonymous carts stay in the cart store until checkout.
+        if user is None:
+            line, created = api_cart.add_line(cart_id, course, price, tax_fee, country)
+            if created:
+                return Response({"message" : "Cart Created Successfully"}, status = status.HTTP_201_CREATED)
+            return Response({"message" : "Cart Updated Successfully"}, status = status.HTTP_200_OK)
+
+        api_cart.persist(cart_id, user)
         cart = api_models.Cart.objects.filter(cart_id = cart_id, course = course).first()
 
         if cart:
             cart.course = course
             cart.user = user
             cart.price = price
-            cart.tax_fee = Decimal(price) * Decimal(tax_rate)
+            cart.tax_fee = tax_fee
             cart.country = country
             cart.cart_id = cart_id
             cart.total = Decimal(cart.price)+ Decimal(cart.tax_fee)
@@ -213,7 +404,7 @@ class CartAPIView(generics.CreateAPIView):
             cart.course = course
             cart.user = user
             cart.price = price
-            cart.tax_fee = Decimal(price) * Decimal(tax_rate)
+            cart.tax_fee = tax_fee
             cart.country = country
             cart.cart_id = cart_id
             cart.total = Decimal(cart.price)+ Decimal(cart.tax_fee)
@@ -224,22 +415,50 @@ class CartAPIView(generics.CreateAPIView):
 class CartListAPIView(generics.ListAPIView):
     serializer_class = api_serializer.CartSerializer
     permission_classes = [AllowAny]
+    pagination_class = CartPagination
 
     def get_queryset(self):
-        cart_id = self.kwargs['cart_id']
-        queryset = api_models.Cart.objects.filter(cart_id = cart_id)
-        return queryset
+        # Cart rows plus lines still in the cart store; a cart is small
+        # enough to merge in memory.
+        return api_cart.merged(self.kwargs['cart_id'])
     
 class CartItemDeleteAPIView(generics.DestroyAPIView):
     serializer_class = api_serializer.CartSerializer
     permission_classes = [AllowAny]
 
+    def destroy(self, request, *args, **kwargs):
+        if not self.kwargs['item_id'].lstrip("-").isdigit():
+            raise NotFound("Cart item not found")
+        if api_cart.is_line_id(self.kwargs['item_id']):
+            if not api_cart.remove_line(self.kwargs['cart_id'], self.kwargs['item_id']):
+                raise NotFound("Cart item not found")
+            return Response(status = status.HTTP_204_NO_CONTENT)
+        return super().destroy(request, *args, **kwargs)
+
     def get_object(self):
         cart_id = self.kwargs['cart_id']
         item_id = self.kwargs['item_id']
 
         return api_models.Cart.objects.filter(cart_id = cart_id, id = item_id).first()
     
+class CoursePriceWithTaxAPIView(generics.GenericAPIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            course_ids = [int(pk) for pk in request.query_params.get('course_ids', '').split(',') if pk]
+        except ValueError:
+            raise ValidationError({"course_ids": "Course ids must be a comma separated list of numbers"})
+
+        country, _ = tax_table.lookup(request.query_params.get('country'))
+        prices = dict(api_models.Course.objects.filter(id__in=course_ids).values_list("id", "price"))
+        priced = tax_table.prices(prices, country)
+        data = [
+            {"course_id": pk, "price": priced[pk][0], "tax_fee": priced[pk][1], "total": priced[pk][2]}
+            for pk in course_ids if pk in priced
+        ]
+        return Response({"country": country, "courses": data})
+
 class CartStatsAPIView(generics.RetrieveAPIView):
     serializer_class = api_serializer.CartSerializer
     permission_classes = [AllowAny]
@@ -251,35 +470,20 @@ class CartStatsAPIView(generics.RetrieveAPIView):
         return queryset
     
     def get(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-
-        total_price = 0.00
-        total_tax = 0.00
-        total_total = 0.00
-
-        for cart_item in queryset:
-            total_price += float(self.calculate_price(cart_item))
-            total_tax += float(self.calculate_tax(cart_item))
-            total_total += round(float(self.calculate_total(cart_item)), 2)
-
-        data = {
-            "price" : total_price,
-            "tax": total_tax,
-            "total": total_total,
-        }
+        return Response(api_cart.summary(self.kwargs['cart_id']))
 
-        return Response(data)
+class CartDetailAPIView(generics.GenericAPIView):
+    serializer_class = api_serializer.CartSerializer
+    permission_classes = [AllowAny]
 
-    def calculate_price(self, cart_item):
-        return cart_item.price
-    
-    def calculate_tax(self, cart_item):
-        return cart_item.tax_fee
-    
-    def calculate_total(self, cart_item):
-        return cart_item.total
+    def get(self, request, *args, **kwargs):
+        cart_id = self.kwargs['cart_id']
+        return Response({
+            "items": self.get_serializer(api_cart.merged(cart_id), many=True).data,
+            "stats": api_cart.summary(cart_id),
+        })
 
-class CreateOrderAPIView(generics.CreateAPIView):
+class CreateOrderAPIView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = api_serializer.CartOrderSerializer
     permission_classes = [AllowAny]
     queryset = api_models.CartOrder.objects.all()
@@ -292,34 +496,28 @@ class CreateOrderAPIView(generics.CreateAPIView):
         user_id = request.data['user_id']
 
         if user_id!=0:
-            user = api_models.User.objects.filter(id = user_id)
+            user = api_models.User.objects.filter(id = user_id).first()
         else:
             user = None
 
-        cart_items = api_models.Cart.objects.filter(cart_id = cart_id)
-
-        total_price = Decimal(0.00)
-        total_tax = Decimal(0.00)
-        total_initial_total = Decimal(0.00)
-        total_total = Decimal(0.00)
+        with transaction.atomic():
+            # Checkout is where an anonymous cart first becomes Cart rows.
+            api_cart.persist(cart_id, user)
+            cart_items = list(api_models.Cart.objects.filter(cart_id = cart_id).select_related("course"))
 
-        order = api_models.CartOrder.objects.create(full_name = full_name, email = email, country = country, student = user)
+            total_price = sum((c.price for c in cart_items), Decimal(0.00))
+            total_tax = sum((c.tax_fee for c in cart_items), Decimal(0.00))
+            total_total = sum((c.total for c in cart_items), Decimal(0.00))
 
-        for c in cart_items:
-            api_models.CartOrderItem.objects.create(order = order, course = c.course, price = c.price, tax_fee = c.tax_fee, total = c.total, initial_total = c.total, teacher = c.course.teacher)
-       
-            total_price += Decimal(c.price)
-            total_tax += Decimal(c.tax_fee)
-            total_initial_total += Decimal(c.total)
-            total_total += Decimal(c.total)
-
-            order.teachers.add(c.course.teacher)
-
-        order.sub_total = total_price
-        order.tax_fee = total_tax
-        order.initial_total = total_initial_total
-        order.total = total_total
-        order.save()
+            order = api_models.CartOrder.objects.create(
+                full_name = full_name, email = email, country = country, student = user,
+                sub_total = total_price, tax_fee = total_tax, initial_total = total_total, total = total_total,
+            )
+            api_models.CartOrderItem.objects.bulk_create([
+                api_models.CartOrderItem(order = order, course_id = c.course_id, price = c.price, tax_fee = c.tax_fee, total = c.total, initial_total = c.total, teacher_id = c.course.teacher_id)
+                for c in cart_items
+            ])
+            order.teachers.add(*{c.course.teacher_id for c in cart_items if c.course.teacher_id})
 
         return Response({"message" : "Order Created Successfully", "order_oid": order.oid}, status = status.HTTP_201_CREATED)
 
@@ -329,7 +527,7 @@ class CheckoutAPIView(generics.RetrieveAPIView):
     queryset = api_models.CartOrder.objects.all()
     lookup_field = 'oid'
 
-class CouponApplyAPIView(generics.CreateAPIView):
+class CouponApplyAPIView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = api_serializer.CouponSerializer
     permission_classes = [AllowAny]
 
@@ -337,37 +535,14 @@ class CouponApplyAPIView(generics.CreateAPIView):
         order_oid = request.data['order_oid']
         coupon_code = request.data['coupon_code']
 
-        order = api_models.CartOrder.objects.get(oid = order_oid) 
-        coupon = api_models.Coupon.objects.get(code = coupon_code)
-
-        if coupon:
-            order_items = api_models.CartOrderItem.objects.filter(order = order, teacher = coupon.teacher)
-
-            for i in order_items:
-                if not coupon in i.coupons.all():
-                    discount = i.total * coupon.discount / 100
-
-                    i.total -= discount
-                    i.price -= discount
-                    i.saved += discount
-                    i.applied_coupon = True
-                    i.coupons.add(coupon)
+        try:
+            applied = coupons.apply(order_oid, coupon_code)
+        except coupons.CouponError as e:
+            return Response({"message": str(e)}, status = e.status_code)
 
-                    order.coupons.add(coupon) 
-                    order.total -= discount
-                    order.sub_total -= discount
-                    order.saved += discount
-
-                    i.save()
-                    order.save()
-                    coupon.used_by.add(order.student)
-
-                    return Response({"message": "Coupon Found and Activated"}, status = status.HTTP_201_CREATED)
-                else:
-                    return Response({"message": "Coupon Already Applied"}, status = status.HTTP_200_OK)
-        else:
-            return Response({"message": "Coupon Not Found"}, status = status.HTTP_404_NOT_FOUND)
-        
+        if applied:
+            return Response({"message": "Coupon Found and Activated"}, status = status.HTTP_201_CREATED)
+        return Response({"message": "Coupon Already Applied"}, status = status.HTTP_200_OK)
 
 
 # class StripeCheckoutAPIView(generics.CreateAPIView):
@@ -409,23 +584,7 @@ class CouponApplyAPIView(generics.CreateAPIView):
     #         return({"message": f"Something went wrong when trying to make payment. Error: {str(e)}"})
 
 
-def get_access_token(client_id, secret_key):
-    token_url = "https://sandbox.paypal.com/v1/oauth/token"
-    data = {'grant_type': 'client_credentials'}
-    auth =  (client_id, secret_key)
-    response = requests.post(token_url, data=data, auth=auth)
-
-    if response.status_code == 200:
-        print("Access Token ====", response.json()['access_token'])
-        return response.json()['access_token']
-    
-    else:
-        raise Exception(f"Failed to get access token from paypal{response.status_code}")
-            
-
-
-
-class PaymentSuccessAPIView(generics.CreateAPIView):
+class PaymentSuccessAPIView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = api_serializer.CartOrderSerializer
     queryset = api_models.CartOrder.objects.all()
 
@@ -435,57 +594,87 @@ class PaymentSuccessAPIView(generics.CreateAPIView):
         paypal_order_id = request.data['paypal_order_id']
 
         order = api_models.CartOrder.objects.get(oid=order_oid)
-        order_items = api_models.CartOrderItem.objects.filter(order=order)
 
         #PayPal payment success
-        if paypal_order_id != "null":
-            paypal_api_url = f"https://api-m.sandbox.paypal.com/v2/checkout/orders{paypal_order_id}"
-            headers = {
-                'Content-Type': 'application-json',
-                'Authorization': f"Bearer {get_access_token(PAYPAL_CLIENT_ID, PAYPAL_SECRET_ID)}"
-            }
-            response = requests.get(paypal_api_url, headers=headers)
-            if response.status_code == 200:
-                paypal_order_data = response.json()
-                paypal_order_status = paypal_order_data['status']
-                if paypal_order_status == "COMPLETED":
-                    if order.payment_status == "Processing":
-                        order.payment_status = "Paid"
-                        order.save()
-
-                        api_models.Notification.objects.create(user=order.student, order=order, type="Course Enrollment Completed")
-
-                        for o in order_items:
-                            api_models.Notification.objects.create(
-                                teacher = o.teacher,
-                                order=order,
-                                order_item = o,
-                                type = "New Order",
-                            )
-                            api_models.EnrolledCourse.objects.create(
-                                course=o.course,
-                                user=order.student,
-                                teacher=o.teacher,
-                                order_item=o
-                            )
-
-                    else:
-                        return Response({"message": "You have already paid. Thank you"})
-                else:
-                    return Response({"message": "Payment Not Successful"})    
-            else:
-                return Response({"message": "An API Error occured from paypal"})
-                    
+        if paypal_order_id == "null":
+            return Response({"message": "Payment Not Successful"})
+        if order.payment_status == "Paid":
+            return Response({"message": "You have already paid. Thank you", "payment_status": order.payment_status})
+
+        # Verification and enrollment run in manage.py verify_payments; the
+        # client polls payment/status/<order_oid>/ for the outcome.
+        verification, created = payments.request_verification(order, paypal_order_id)
+        return Response({
+            "message": "Payment verification in progress",
+            "order_oid": order.oid,
+            "payment_status": order.payment_status,
+            "verification_status": verification.status,
+        }, status = status.HTTP_202_ACCEPTED)
+
+
+class PaymentStatusAPIView(generics.GenericAPIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        order = (api_models.CartOrder.objects.select_related("payment_verification")
+                 .filter(oid=self.kwargs['order_oid']).first())
+        if order is None:
+            raise NotFound("Order not found")
+        verification = getattr(order, "payment_verification", None)
+        return Response({
+            "order_oid": order.oid,
+            "payment_status": order.payment_status,
+            "verification_status": verification.status if verification else None,
+            "error": verification.error if verification and verification.status in ("Rejected", "Failed") else None,
+        })
 
 
 class SearchCourseAPIView(generics.ListAPIView):
-    serializer_class = api_serializer.CourseSerializer
+    serializer_class = api_serializer.CourseCatalogSerializer
     permission_classes = [AllowAny]
+    pagination_class = SearchResultsPagination
 
     def get_queryset(self):
         query = self.request.GET.get('query')
+        queryset = api_models.Course.objects.published().catalog()
+
+        language = self.request.GET.get('language')
+        level = self.request.GET.get('level')
+        if language:
+            queryset = queryset.filter(language=language)
+        if level:
+            queryset = queryset.filter(level=level)
+
+        try:
+            min_price = self.request.GET.get('min_price')
+            max_price = self.request.GET.get('max_price')
+            if min_price:
+                queryset = queryset.filter(price__gte=Decimal(min_price))
+            if max_price:
+                queryset = queryset.filter(price__lte=Decimal(max_price))
+        except InvalidOperation:
+            raise ValidationError({"message": "Price filters must be numbers"})
+
         #learn lms
-        return api_models.Course.objects.filter(title_icontains=query, platform_status="Published", teacher_course_status="Published")
+        return search.search_courses(queryset, query)
+    
+
+
+class CourseAutocompleteAPIView(generics.ListAPIView):
+    serializer_class = api_serializer.AutocompleteSuggestionSerializer
+    permission_classes = [AllowAny]
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        query = request.GET.get('query', '')
+        try:
+            limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+        except ValueError:
+            limit = 8
+
+        suggestions = autocomplete.suggest(query, limit)
+        serializer = self.get_serializer(suggestions, many=True)
+        return Response(serializer.data)
     
 
 
@@ -516,14 +705,14 @@ class StudentSummaryAPIView(generics.ListAPIView):
 
 
 class StudentCourseListAPIView(generics.ListAPIView):
-    serializer_class = api_serializer.EnrolledCourseSerializer
+    # Course cards with progress only; the lesson, note and Q&A tree is
+    # served per enrollment by StudentCourseDetailAPIView.
+    serializer_class = api_serializer.EnrolledCourseSummarySerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
         user_id = self.kwargs['user_id']
-        user = User.objects.get(id=user_id)
-
-        return api_models.EnrolledCourse.objects.filter(user=user)
+        return api_models.EnrolledCourse.objects.filter(user_id=user_id).learning_summary()
     
 
 
@@ -1164,4 +1353,82 @@ class CourseVariantItemDeleteAPIVIew(generics.DestroyAPIView):
         teacher = api_models.Teacher.objects.get(id=teacher_id)
         course = api_models.Course.objects.get(teacher=teacher, course_id=course_id)
         variant = api_models.Variant.objects.get(variant_id=variant_id, course=course)
-        return api_models.VariantItem.objects.get(variant=variant, variant_item_id=variant_item_id)
\ No newline at end of file
+        return api_models.VariantItem.objects.get(variant=variant, variant_item_id=variant_item_id)
+
+
+class UploadSessionCreateAPIView(generics.CreateAPIView):
+    serializer_class = api_serializer.UploadSessionSerializer
+    permission_classes = [AllowAny]
+
+    def create(self, request, *args, **kwargs):
+        teacher = api_models.Teacher.objects.filter(id=request.data.get('teacher_id')).first()
+        if teacher is None:
+            raise NotFound("Teacher not found")
+        try:
+            size = int(request.data['size'])
+            chunk_size = int(request.data['chunk_size']) if request.data.get('chunk_size') else None
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({"size": "Size and chunk_size must be numbers of bytes"})
+
+        try:
+            session = uploads.start(teacher, request.data.get('filename') or "upload", size, chunk_size)
+        except uploads.UploadError as e:
+            raise ValidationError({"message": str(e)})
+        return Response(self.get_serializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionMixin:
+
+    def get_object(self):
+        session = api_models.UploadSession.objects.filter(
+            upload_id=self.kwargs['upload_id'], teacher_id=self.kwargs['teacher_id']
+        ).first()
+        if session is None:
+            raise NotFound("Upload not found")
+        return session
+
+
+class UploadSessionDetailAPIView(UploadSessionMixin, generics.RetrieveDestroyAPIView):
+    serializer_class = api_serializer.UploadSessionSerializer
+    permission_classes = [AllowAny]
+
+    def perform_destroy(self, instance):
+        if instance.status == "Active":
+            uploads.abort(instance)
+
+
+class UploadChunkAPIView(UploadSessionMixin, generics.GenericAPIView):
+    permission_classes = [AllowAny]
+
+    def put(self, request, *args, **kwargs):
+        # The body is the raw chunk; it is streamed to storage without going
+        # through DRF's parsers.
+        session = self.get_object()
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            chunk = uploads.write_chunk(
+                session, int(self.kwargs['index']), request.stream, length,
+                sha256=request.META.get('HTTP_X_CHUNK_SHA256'),
+            )
+        except uploads.UploadError as e:
+            raise ValidationError({"message": str(e)})
+        return Response({"index": chunk.index, "size": chunk.size, "sha256": chunk.sha256}, status=status.HTTP_200_OK)
+
+
+class UploadSessionFinalizeAPIView(UploadSessionMixin, generics.GenericAPIView):
+    serializer_class = api_serializer.UploadSessionSerializer
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        session = self.get_object()
+        item = api_models.VariantItem.objects.filter(
+            variant_item_id=request.data.get('variant_item_id'), variant__course__teacher_id=session.teacher_id
+        ).first()
+        if item is None:
+            raise NotFound("Lesson not found")
+
+        try:
+            session = uploads.finish(session, item)
+        except uploads.UploadError as e:
+            raise ValidationError({"message": str(e)})
+        return Response(self.get_serializer(session).data, status=status.HTTP_200_OK)
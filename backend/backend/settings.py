@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     #Customer apps
     'api',
@@ -159,6 +160,10 @@ STATIC_ROOT = BASE_DIR / 'templates'
 MEDIA_URL = '/media/' #127.0.0.1/media/avatar.png
 MEDIA_ROOT = BASE_DIR / 'media'
 
+#Lesson media streaming: "nginx" (X-Accel-Redirect), "apache" (X-Sendfile) or empty to stream from the app server
+MEDIA_SENDFILE_BACKEND = env("MEDIA_SENDFILE_BACKEND", "")
+MEDIA_ACCEL_PREFIX = env("MEDIA_ACCEL_PREFIX", "/protected-media/")
+
 
 AUTH_USER_MODEL = 'userauths.User'
 
@@ -179,6 +184,8 @@ EMAIL_BACKEND = 'anymail.backends.mailgun.EmailBackend'
 #PayPal API Keys
 PAYPAL_CLIENT_ID = env("PAYPAL_CLIENT_ID")
 PAYPAL_SECRET_ID = env("PAYPAL_SECRET_ID")
+#Point at http://127.0.0.1:8765 with `manage.py paypal_stub` for local runs
+PAYPAL_API_BASE = env("PAYPAL_API_BASE", "https://api-m.sandbox.paypal.com")
 
 #AWS S3 Settings
 
@@ -187,7 +194,13 @@ AWS_SECRET_ACCESS_KEY = env("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = env("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_SIGNATURE_NAME = 's3v4',
 AWS_S3_REGION_NAME = env("AWS_S3_REGION_NAME")
-DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+DEFAULT_FILE_STORAGE = 'api.storage.ContentAddressedS3Storage'
+
+#Uploads are hashed while streaming in so identical files are stored once
+FILE_UPLOAD_HANDLERS = [
+    'api.storage.HashingMemoryFileUploadHandler',
+    'api.storage.HashingTemporaryFileUploadHandler',
+]
 CORRECT_CLOCK_SKEW = True
 # STATICFILES_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
@@ -270,4 +283,40 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+#Cache settings
+#course_detail: file based so the web workers and the management commands of one host share invalidations;
+#Redis/Memcached when several hosts serve the API
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'course_detail': {
+        'BACKEND': env("COURSE_CACHE_BACKEND", 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': env("COURSE_CACHE_LOCATION", os.path.join(BASE_DIR, 'cache', 'course-detail')),
+        'TIMEOUT': env.int("COURSE_CACHE_TIMEOUT", 300),
+        'OPTIONS': {'MAX_ENTRIES': env.int("COURSE_CACHE_MAX_ENTRIES", 2000)},
+    },
+    #cart_summary: cart totals; shared like course_detail so a change made by one worker reaches the others
+    'cart_summary': {
+        'BACKEND': env("CART_SUMMARY_CACHE_BACKEND", 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': env("CART_SUMMARY_CACHE_LOCATION", os.path.join(BASE_DIR, 'cache', 'cart-summary')),
+        'OPTIONS': {'MAX_ENTRIES': env.int("CART_SUMMARY_CACHE_MAX_ENTRIES", 2000)},
+    },
+    #carts: only used with CART_STORE=api.cart.CacheCartStore; point it at Redis/Memcached when several hosts serve the cart
+    'carts': {
+        'BACKEND': env("CART_CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env("CART_CACHE_LOCATION", 'carts'),
+    },
+}
+
+#Anonymous carts until checkout: one file per cart, shared by the workers of one host and expired after CART_TTL
+CART_STORE = env("CART_STORE", 'api.cart.FileCartStore')
+CART_STORE_DIR = env("CART_STORE_DIR", os.path.join(BASE_DIR, 'cache', 'cart-store'))
+CART_TTL = env.int("CART_TTL", 7 * 24 * 60 * 60)
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.DateCursorPagination',
+    'PAGE_SIZE': 20,
+}
+
 CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file